@@ -1,10 +1,16 @@
 import os
 import cv2
+import glob
+import logging
 import json
 import shutil
 import tempfile
+import time
+import hashlib
+import subprocess
+from collections import OrderedDict
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, session, Response
+from flask import Flask, render_template, request, jsonify, send_file, session, Response, g
 from flask_cors import CORS
 import yt_dlp
 import uuid
@@ -13,25 +19,170 @@ import base64
 from io import BytesIO
 from PIL import Image
 import numpy as np
-import requests
+import threading
+import contextvars
+import metrics
+import profiling
+import session_store
+from concurrent.futures import ThreadPoolExecutor
+from frame_budget import BudgetExceeded, FrameBuffer, MemoryBudget
+from dataset_export import EXPORT_FORMATS, DatasetWriter, parse_splits, write_file
+from frame_store import SOURCE_ORIGINAL, SOURCE_PROXY, FrameStore
+from phash_index import HashIndexStore, hamming_distances, phash
+from roboflow_client import RoboflowProject
+from logging_setup import configure_logging, current_request_id
+from pipeline import Pipeline, Stage
+
+configure_logging()
+logger = logging.getLogger('videoapp')
 
 app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'  # Change this in production
+app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')  # Set SECRET_KEY in production
 CORS(app)
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'output'
 TEMP_FOLDER = 'temp'
+PROXY_FOLDER = 'proxies'
+IMPORT_FOLDER = 'imports'
+INDEX_FOLDER = 'indexes'
+SESSION_DB = 'sessions.db'
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
 
+# Overridable so benchmarks and tests can point uploads at a local stub
+ROBOFLOW_API_URL = os.environ.get('ROBOFLOW_API_URL', 'https://api.roboflow.com')
+# Seconds a successful API key/project check is reused before asking Roboflow again
+ROBOFLOW_VALIDATION_TTL = 300
+# Throttled (429), failed (5xx) or dropped uploads are retried up to
+# ROBOFLOW_UPLOAD_RETRIES times, backing off from ROBOFLOW_BACKOFF seconds
+# and doubling up to ROBOFLOW_BACKOFF_MAX
+ROBOFLOW_UPLOAD_RETRIES = 4
+ROBOFLOW_BACKOFF = 0.5
+ROBOFLOW_BACKOFF_MAX = 30
+ROBOFLOW_TIMEOUT = 60
+
+# Server-side directories that /add_batch may register local files from.
+# Paths and globs must be relative and are resolved inside each root.
+IMPORT_ROOTS = [IMPORT_FOLDER]
+BATCH_WORKERS = 8
+BATCH_MAX_ITEMS = 500
+
+# Proxy transcoding: an all-intra (MJPEG) reduced-resolution copy of each video
+# used for scrubbing and preview extraction. Final saves still read the original.
+# Least recently used proxies are deleted once PROXY_FOLDER exceeds PROXY_BUDGET
+# and re-transcoded if their video is opened again.
+PROXY_ENABLED = True
+PROXY_MAX_HEIGHT = 480
+PROXY_JPEG_QUALITY = 85
+PROXY_WORKERS = 2
+PROXY_BUDGET = 20 * 1024 * 1024 * 1024
+
+# Frame-accurate seeking: per-video presentation timestamp indexes are cached
+# as .npy files in INDEX_FOLDER. Gaps of up to SEEK_THRESHOLD frames between
+# wanted frames are decoded through rather than seeked over.
+SEEK_THRESHOLD = 48
+TIMESTAMP_CACHE_SIZE = 64
+
+# Encoded preview frames are kept in FRAME_STORE_FOLDER so revisited segments
+# skip the decoder; least recently used videos are evicted past the budget.
+FRAME_STORE_FOLDER = 'frame_store'
+FRAME_STORE_BUDGET = 5 * 1024 * 1024 * 1024
+# FRAME_STORE_COLD=1 empties a video's stored frames before each
+# /extract_frames, so load tests measure first views (see benchmarks/loadtest.py)
+FRAME_STORE_COLD = os.environ.get('FRAME_STORE_COLD') == '1'
+
+# Memory caps for /extract_frames previews (per worker process). Frames past a
+# request's share, or that can't get global budget within EXTRACT_WAIT_SECONDS,
+# are left in the frame store and served by URL; EXTRACT_SPILL_LIMIT is a hard
+# per-request cap beyond which the request fails.
+EXTRACT_MEMORY_BUDGET = 1024 * 1024 * 1024
+EXTRACT_REQUEST_MEMORY = 256 * 1024 * 1024
+EXTRACT_SPILL_LIMIT = 2 * 1024 * 1024 * 1024
+EXTRACT_WAIT_SECONDS = 10
+
+# Most segments one /extract_frames call may request
+EXTRACT_MAX_SEGMENTS = 100
+
+# Most frames one /prefetch_frames call may decode
+PREFETCH_MAX_FRAMES = 120
+
+# Saved frame files. Encoding runs on SAVE_WORKERS threads (OpenCV releases
+# the GIL while encoding). PNG compression 0-9 trades size for speed; WebP
+# quality above 100 is lossless.
+SAVE_FORMAT = 'png'
+SAVE_FORMATS = {'png', 'jpg', 'webp'}
+SAVE_PNG_COMPRESSION = 1
+SAVE_JPEG_QUALITY = 95
+SAVE_WEBP_QUALITY = 101
+SAVE_WORKERS = min(8, os.cpu_count() or 1)
+
+# Saving runs as a pipeline (decode -> encode -> write || upload) so disk
+# writes and Roboflow uploads overlap. Each stage buffers at most
+# SAVE_QUEUE_SIZE frames; UPLOAD_WORKERS uploads run concurrently.
+SAVE_QUEUE_SIZE = 16
+UPLOAD_WORKERS = 4
+
+# Dataset exports (see dataset_export.py) start a new WebDataset shard after
+# this many frames or bytes, whichever comes first
+EXPORT_SHARD_FRAMES = 1000
+EXPORT_SHARD_BYTES = 1024 * 1024 * 1024
+
+# Perceptual hashes of uploaded frames are kept per Roboflow project in
+# HASH_INDEX_FOLDER. With dedupe enabled in the Roboflow config, a frame
+# within DEDUPE_DISTANCE bits (of 64) of one already uploaded to the project,
+# or earlier in the same batch, is skipped or flagged.
+HASH_INDEX_FOLDER = 'hash_index'
+DEDUPE_DISTANCE = 6
+
+# Upload policy. By default the browser's JPEG is uploaded at native
+# resolution; a Roboflow config with uploadMaxSize (longest side in pixels),
+# uploadQuality or uploadFormat has each frame resized and re-encoded on the
+# encode threads before upload instead.
+UPLOAD_FORMATS = {'jpg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+UPLOAD_QUALITY = 90
+
 # Create necessary directories
-for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER, TEMP_FOLDER]:
+for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER, TEMP_FOLDER, PROXY_FOLDER, IMPORT_FOLDER, INDEX_FOLDER, FRAME_STORE_FOLDER, HASH_INDEX_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 
+session_store.init_store(SESSION_DB)
+
+# Background proxy transcodes; job state is kept on the video's store entry
+proxy_executor = ThreadPoolExecutor(max_workers=PROXY_WORKERS)
+proxy_futures = {}
+
+# Frame rate each proxy was written at, keyed by proxy path. Filled when a
+# proxy is built, or by one probe for proxies built by an earlier process.
+proxy_fps_cache = {}
+
+# Set when the server is shutting down; long-running background work checks it
+shutdown_event = threading.Event()
+
+# In-process LRU cache of loaded timestamp indexes, keyed by index file path
+timestamp_cache = OrderedDict()
+timestamp_cache_lock = threading.Lock()
+
+# Shared by all /extract_frames requests in this process
+extract_memory = MemoryBudget(EXTRACT_MEMORY_BUDGET)
+frame_store = FrameStore(FRAME_STORE_FOLDER, FRAME_STORE_BUDGET)
+hash_indexes = HashIndexStore(HASH_INDEX_FOLDER)
+
+def get_session_id():
+    """Return the server-side session id, issuing one if needed"""
+    if 'sid' not in session:
+        session['sid'] = str(uuid.uuid4())
+    return session['sid']
+
+def get_session_video(video_id):
+    """Look up a video registered to the current session"""
+    if not video_id:
+        return None
+    return session_store.get_video(get_session_id(), video_id)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -44,8 +195,10 @@ def download_youtube_video(url, output_path):
     ydl_opts = {
         'format': 'best[ext=mp4]/best',
         'outtmpl': output_path + '.%(ext)s',
-        'quiet': False,  # Show progress for debugging
+        'quiet': True,
+        'noprogress': True,
         'no_warnings': False,
+        'logger': logging.getLogger('videoapp.ytdlp'),
     }
     
     try:
@@ -54,43 +207,549 @@ def download_youtube_video(url, output_path):
             # Get the actual filename (yt-dlp might add extension)
             return True, info.get('title', 'YouTube Video')
     except Exception as e:
-        print(f"Error downloading YouTube video: {e}")
+        logger.warning('YouTube download failed', extra={'url': url, 'error': str(e)})
         return False, str(e)
 
-def extract_frames(video_path, start_time, duration=30, target_fps=30):
-    """Extract frames from video at specified fps"""
+def fetch_youtube_video(url):
+    """Download a YouTube video into TEMP_FOLDER under a new video id"""
+    video_id = str(uuid.uuid4())
+    base_path = os.path.join(TEMP_FOLDER, video_id)
+    
+    logger.info('Downloading YouTube video', extra={'url': url, 'video_id': video_id})
+    
+    started = time.perf_counter()
+    success, title_or_error = download_youtube_video(url, base_path)
+    elapsed = time.perf_counter() - started
+    if not success:
+        return False, f'Failed to download: {title_or_error}'
+    
+    video_path = None
+    for file in os.listdir(TEMP_FOLDER):
+        if file.startswith(video_id):
+            video_path = os.path.join(TEMP_FOLDER, file)
+            break
+    
+    if not video_path:
+        logger.error('Downloaded file not found', extra={'video_id': video_id})
+        return False, 'Downloaded file not found'
+    
+    size = os.path.getsize(video_path)
+    logger.info('YouTube video downloaded', extra={
+        'video_id': video_id, 'path': video_path, 'bytes': size, 'seconds': round(elapsed, 3)
+    })
+    if elapsed > 0:
+        metrics.DOWNLOAD_SPEED.observe(size / elapsed)
+    
+    return True, {
+        'id': video_id,
+        'path': video_path,
+        'name': title_or_error if title_or_error else url,
+        'type': 'youtube'
+    }
+
+def probe_video(video_path):
+    """Read basic stream metadata, or None if the video cannot be opened"""
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         return None
     
     fps = cap.get(cv2.CAP_PROP_FPS)
-    start_frame = int(start_time * fps)
-    end_frame = int((start_time + duration) * fps)
-    frame_interval = int(fps / target_fps) if fps > target_fps else 1
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
     
-    frames = []
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    return {
+        'fps': fps,
+        'frame_count': frame_count,
+        'duration': frame_count / fps if fps > 0 else 0,
+        'width': width,
+        'height': height
+    }
+
+def video_cache_key(video_path):
+    """Key for per-video caches, derived from the file's path, size and mtime"""
+    stat = os.stat(video_path)
+    key = f'{os.path.realpath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def timestamp_index_path(video_path):
+    """Cache location of a video's timestamp index"""
+    return os.path.join(INDEX_FOLDER, video_cache_key(video_path) + '.npy')
+
+def _checked_timestamps(timestamps, fps):
+    """Fall back to a constant-rate index if the container's timestamps are unusable"""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if len(timestamps) > 1 and np.any(np.diff(timestamps) <= 0):
+        return np.arange(len(timestamps), dtype=np.float64) / (fps or 30)
+    return timestamps
+
+def _demux_timestamps(video_path):
+    """Read frame timestamps from packet headers with ffprobe, without decoding"""
+    ffprobe = shutil.which('ffprobe')
+    if not ffprobe:
+        return None
     
-    for frame_num in range(start_frame, end_frame, frame_interval):
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-        ret, frame = cap.read()
-        
-        if not ret:
-            break
-        
-        # Convert frame to base64 for web display
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame_base64 = base64.b64encode(buffer).decode('utf-8')
-        
-        frames.append({
-            'data': frame_base64,
-            'frame_num': frame_num,
-            'time': frame_num / fps
-        })
+    try:
+        result = subprocess.run(
+            [ffprobe, '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'packet=pts_time', '-of', 'csv=p=0', video_path],
+            capture_output=True, text=True, timeout=600
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    
+    times = []
+    for line in result.stdout.split():
+        try:
+            times.append(float(line.strip(',')))
+        except ValueError:
+            continue
+    if not times:
+        return None
     
+    # Packets arrive in decode order; presentation order is sorted pts
+    timestamps = np.sort(np.array(times, dtype=np.float64))
+    return timestamps - timestamps[0]
+
+def _decode_timestamps(video_path):
+    """Read frame timestamps by stepping the decoder through the whole video"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    times = []
+    while cap.grab():
+        times.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
     cap.release()
+    
+    return _checked_timestamps(times, fps) if times else None
+
+def save_timestamp_index(video_path, timestamps):
+    index_path = timestamp_index_path(video_path)
+    partial_path = index_path + '.part.npy'
+    np.save(partial_path, np.asarray(timestamps, dtype=np.float64))
+    os.replace(partial_path, index_path)
+
+def load_timestamp_index(video_path):
+    """Return the presentation time (seconds) of every frame as a sorted float64 array.
+
+    The index is built once per file (ffprobe demux, or a decode pass when ffprobe
+    is unavailable) and cached on disk and in memory. Returns None if the video
+    cannot be read.
+    """
+    if not os.path.exists(video_path):
+        return None
+    
+    index_path = timestamp_index_path(video_path)
+    with timestamp_cache_lock:
+        timestamps = timestamp_cache.get(index_path)
+        if timestamps is not None:
+            timestamp_cache.move_to_end(index_path)
+    if timestamps is not None:
+        metrics.cache_result('timestamp_index', True)
+        return timestamps
+    
+    metrics.cache_result('timestamp_index', os.path.exists(index_path))
+    if os.path.exists(index_path):
+        timestamps = np.load(index_path)
+    else:
+        timestamps = _demux_timestamps(video_path)
+        if timestamps is None:
+            timestamps = _decode_timestamps(video_path)
+        if timestamps is None or len(timestamps) == 0:
+            return None
+        save_timestamp_index(video_path, timestamps)
+    
+    with timestamp_cache_lock:
+        timestamp_cache[index_path] = timestamps
+        timestamp_cache.move_to_end(index_path)
+        while len(timestamp_cache) > TIMESTAMP_CACHE_SIZE:
+            timestamp_cache.popitem(last=False)
+    return timestamps
+
+def frame_at_time(timestamps, seconds):
+    """Index of the first frame presented at or after the given time"""
+    # Small tolerance so times computed from float timestamps round-trip
+    return int(np.searchsorted(timestamps, seconds - 1e-6))
+
+def _grabbed_frame(cap, timestamps):
+    """Frame number of the last grabbed frame, matched by its presentation time"""
+    seconds = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+    i = int(np.searchsorted(timestamps, seconds))
+    if i > 0 and (i == len(timestamps) or seconds - timestamps[i - 1] < timestamps[i] - seconds):
+        i -= 1
+    return i
+
+def _seek(cap, target, timestamps):
+    """Seek to at or before a frame; returns the frame number grabbed, or None at end of stream"""
+    backoff = 0
+    while True:
+        seek_frame = max(0, target - backoff)
+        cap.set(cv2.CAP_PROP_POS_MSEC, timestamps[seek_frame] * 1000)
+        if cap.grab():
+            current = _grabbed_frame(cap, timestamps)
+            if current <= target:
+                return current
+        if seek_frame == 0:
+            return None
+        # Landed past the target, or past the end of stream: OpenCV maps seek times
+        # through the nominal fps, which drifts on VFR video. Back off further.
+        backoff = backoff * 2 if backoff else 1
+
+def parse_roi(roi, frame_width, frame_height):
+    """Validate a crop rectangle in source pixels, with an optional output size.
+
+    roi is {x, y, width, height} plus optional output_width and/or
+    output_height (one alone keeps the crop's aspect ratio). The result also
+    records the frame size the rectangle refers to, so it applies to
+    downscaled proxies too. Raises ValueError if invalid.
+    """
+    try:
+        x, y, width, height = (int(roi[key]) for key in ('x', 'y', 'width', 'height'))
+        output_width = int(roi['output_width']) if roi.get('output_width') else None
+        output_height = int(roi['output_height']) if roi.get('output_height') else None
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise ValueError('roi needs integer x, y, width and height')
+    if x < 0 or y < 0 or width < 1 or height < 1 or x + width > frame_width or y + height > frame_height:
+        raise ValueError(f'roi must lie within the {frame_width}x{frame_height} frame')
+    if (output_width is not None and output_width < 1) or (output_height is not None and output_height < 1):
+        raise ValueError('roi output size must be positive')
+    if output_width and not output_height:
+        output_height = max(1, round(height * output_width / width))
+    elif output_height and not output_width:
+        output_width = max(1, round(width * output_height / height))
+    return {
+        'x': x,
+        'y': y,
+        'width': width,
+        'height': height,
+        'output_width': output_width,
+        'output_height': output_height,
+        'frame_width': frame_width,
+        'frame_height': frame_height
+    }
+
+def apply_roi(image, roi):
+    """Crop a decoded frame to an ROI from parse_roi, then resize it to the ROI's output size"""
+    scale_x = image.shape[1] / roi['frame_width']
+    scale_y = image.shape[0] / roi['frame_height']
+    x0, y0 = round(roi['x'] * scale_x), round(roi['y'] * scale_y)
+    x1 = max(x0 + 1, round((roi['x'] + roi['width']) * scale_x))
+    y1 = max(y0 + 1, round((roi['y'] + roi['height']) * scale_y))
+    crop = image[y0:y1, x0:x1]
+    if roi['output_width'] and (crop.shape[1], crop.shape[0]) != (roi['output_width'], roi['output_height']):
+        downscale = roi['output_width'] < crop.shape[1]
+        crop = cv2.resize(crop, (roi['output_width'], roi['output_height']),
+                          interpolation=cv2.INTER_AREA if downscale else cv2.INTER_LINEAR)
+    return crop
+
+def roi_digest(roi):
+    """Short stable id of an ROI, for cache keys and URLs"""
+    return hashlib.sha1(json.dumps(roi, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+def read_frames(video_path, frame_nums, timestamps, roi=None):
+    """Decode the given frames in one forward pass, yielding (frame_num, image).
+
+    timestamps is the file's own index; it identifies which frame the decoder is
+    on after a seek, so frames are exact even for variable-frame-rate video.
+    Skipped frames are only grabbed, not converted. With an roi, each frame is
+    cropped and resized as soon as it is decoded.
+    """
+    if not len(frame_nums):
+        return
+    
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return
+    
+    try:
+        current = -1  # frame number of the last grabbed frame
+        for target in sorted(set(frame_nums)):
+            if target >= len(timestamps):
+                break
+            
+            if target <= current or target - current > SEEK_THRESHOLD:
+                with metrics.timed('seek'):
+                    current = _seek(cap, target, timestamps)
+                if current is None:
+                    return
+            
+            started = time.perf_counter()
+            while current < target:
+                if not cap.grab():
+                    return
+                # Guard against repeated timestamps stalling the position
+                current = max(_grabbed_frame(cap, timestamps), current + 1)
+            
+            if current != target:
+                continue
+            
+            ret, image = cap.retrieve()
+            metrics.observe_stage('decode', time.perf_counter() - started)
+            if ret:
+                if roi is not None:
+                    with metrics.timed('roi'):
+                        image = apply_roi(image, roi)
+                yield target, image
+    finally:
+        cap.release()
+
+def index_fps(timestamps):
+    """Average frame rate implied by a timestamp index"""
+    total_duration = timestamps[-1] * len(timestamps) / (len(timestamps) - 1) if len(timestamps) > 1 else 0
+    return len(timestamps) / total_duration if total_duration > 0 else 30
+
+def segment_frame_nums(timestamps, start_time, duration, target_fps=None, every_nth=None, max_frames=None):
+    """Frame numbers of a segment, decimated by timestamp.
+
+    target_fps samples the segment on a grid of 1/target_fps seconds and
+    takes the first frame at or after each sample time, so the output rate
+    matches the target for any source rate, including variable frame rate;
+    a target above the source rate keeps every frame. every_nth keeps every
+    Nth frame, and max_frames then thins the result evenly to at most that
+    many frames. Returns a list of ints.
+    """
+    start_frame = frame_at_time(timestamps, start_time)
+    end_frame = frame_at_time(timestamps, start_time + duration)
+    if start_frame >= end_frame:
+        return []
+    
+    if target_fps:
+        # A frame is the first at or after a sample time exactly when a grid
+        # point falls since the previous frame. Working per frame rather than
+        # per sample time keeps the cost bounded by the segment's frame count.
+        times = timestamps[start_frame:end_frame]
+        grid_points = np.floor((times - times[0] + 1e-6) * target_fps)
+        first_after_sample = np.concatenate([[True], grid_points[1:] > grid_points[:-1]])
+        frame_nums = np.arange(start_frame, end_frame)[first_after_sample]
+    else:
+        frame_nums = np.arange(start_frame, end_frame)
+    if every_nth:
+        frame_nums = frame_nums[::every_nth]
+    if max_frames and len(frame_nums) > max_frames:
+        frame_nums = frame_nums[np.unique(np.linspace(0, len(frame_nums) - 1, max_frames).round().astype(np.int64))]
+    return frame_nums.tolist()
+
+def parse_segments(data):
+    """Read a request's segments list, or its single start_time/duration; raises ValueError if invalid"""
+    segments = data.get('segments')
+    if segments is None:
+        segments = [{'start_time': data.get('start_time', 0), 'duration': data.get('duration', 30)}]
+    if not isinstance(segments, list) or not segments:
+        raise ValueError('segments must be a non-empty list')
+    if len(segments) > EXTRACT_MAX_SEGMENTS:
+        raise ValueError(f'At most {EXTRACT_MAX_SEGMENTS} segments per request')
+    try:
+        segments = [
+            {'start_time': float(segment.get('start_time', 0)), 'duration': float(segment['duration'])}
+            for segment in segments
+        ]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise ValueError('Each segment needs a numeric start_time and duration')
+    if any(segment['start_time'] < 0 or segment['duration'] <= 0 for segment in segments):
+        raise ValueError('Segments need start_time >= 0 and a positive duration')
+    return segments
+
+def merge_segments(segments):
+    """Sort segments by start time and merge overlapping or touching ones.
+
+    Returns [{'start_time', 'duration', 'requested'}] where requested lists
+    the indices of the input segments each merged segment covers.
+    """
+    merged = []
+    for index in sorted(range(len(segments)), key=lambda i: segments[i]['start_time']):
+        start = segments[index]['start_time']
+        end = start + segments[index]['duration']
+        if merged and start <= merged[-1]['end']:
+            merged[-1]['end'] = max(merged[-1]['end'], end)
+            merged[-1]['requested'].append(index)
+        else:
+            merged.append({'start': start, 'end': end, 'requested': [index]})
+    return [
+        {'start_time': m['start'], 'duration': m['end'] - m['start'], 'requested': m['requested']}
+        for m in merged
+    ]
+
+def segments_frame_nums(timestamps, segments, target_fps=None, every_nth=None, max_frames=None):
+    """Map each frame to sample from merged segments to its segment's index.
+
+    Each segment is sampled as in segment_frame_nums, so max_frames applies
+    per segment. Returns {frame_num: segment index} in frame order.
+    """
+    frame_segments = {}
+    for index, segment in enumerate(segments):
+        for frame_num in segment_frame_nums(timestamps, segment['start_time'], segment['duration'],
+                                            target_fps, every_nth, max_frames):
+            frame_segments.setdefault(frame_num, index)
+    return dict(sorted(frame_segments.items()))
+
+def sampling_options(data):
+    """Read target_fps, every_nth and max_frames from a request; raises ValueError if invalid"""
+    try:
+        target_fps = float(data['target_fps']) if data.get('target_fps') is not None else None
+        every_nth = int(data['every_nth']) if data.get('every_nth') is not None else None
+        max_frames = int(data['max_frames']) if data.get('max_frames') is not None else None
+    except (TypeError, ValueError):
+        raise ValueError('target_fps, every_nth and max_frames must be numbers')
+    if target_fps is not None and not np.isfinite(target_fps):
+        raise ValueError('target_fps must be finite')
+    if (target_fps is not None and target_fps <= 0) or (every_nth is not None and every_nth < 1) or \
+            (max_frames is not None and max_frames < 1):
+        raise ValueError('target_fps, every_nth and max_frames must be positive')
+    return {'target_fps': target_fps, 'every_nth': every_nth, 'max_frames': max_frames}
+
+def proxy_frame_rate(proxy_path):
+    """Frame rate a proxy was written at, or None if it is gone or cannot be opened"""
+    if not os.path.exists(proxy_path):
+        return None
+    fps = proxy_fps_cache.get(proxy_path)
+    if fps is None:
+        metadata = probe_video(proxy_path)
+        if not metadata or not metadata['fps']:
+            return None
+        fps = proxy_fps_cache[proxy_path] = metadata['fps']
+    return fps
+
+def frame_source(video_path, timestamps, proxy_path=None):
+    """Return the (path, timestamps) to decode pixels from: the proxy if usable, else the original"""
+    proxy_fps = proxy_frame_rate(proxy_path) if proxy_path else None
+    if not proxy_fps:
+        return video_path, timestamps
+    # Proxies are constant-rate with one frame per original frame
+    return proxy_path, np.arange(len(timestamps), dtype=np.float64) / proxy_fps
+
+def iter_frames(video_path, start_time, duration=30, target_fps=30, proxy_path=None, every_nth=None, max_frames=None,
+                roi=None):
+    """Yield (frame_num, time, image) for a video segment sampled as in segment_frame_nums.
+
+    Frame numbers and times come from the video's timestamp index. When a
+    proxy is given, pixels are decoded from it instead of the original.
+    Images are cropped to roi if given. Yields nothing if the video cannot
+    be opened.
+    """
+    timestamps = load_timestamp_index(video_path)
+    if timestamps is None:
+        return
+    
+    frame_nums = segment_frame_nums(timestamps, start_time, duration, target_fps, every_nth, max_frames)
+    read_path, read_timestamps = frame_source(video_path, timestamps, proxy_path)
+    for frame_num, frame in read_frames(read_path, frame_nums, read_timestamps, roi):
+        yield frame_num, float(timestamps[frame_num]), frame
+
+def iter_encoded_frames(video_path, timestamps, frame_nums, proxy_path=None, segment=None, roi=None):
+    """Yield (frame_num, jpeg, from_proxy) for the given frames in ascending order.
+
+    With a frame store segment (held locked by the caller), stored frames are
+    read from it and only the rest are decoded, then appended to it. The
+    segment must be the one for roi (see frame_store_key). Frames that
+    cannot be decoded are skipped.
+    """
+    frame_nums = sorted(set(frame_nums))
+    missing = [n for n in frame_nums if segment is None or not segment.has(n)]
+    read_path, read_timestamps = frame_source(video_path, timestamps, proxy_path)
+    from_proxy = read_path != video_path
+    decoded = read_frames(read_path, missing, read_timestamps, roi)
+    
+    try:
+        next_decoded = next(decoded, None)
+        for frame_num in frame_nums:
+            if segment is not None and segment.has(frame_num):
+                metrics.cache_result('frame_store', True)
+                yield frame_num, segment.get(frame_num), segment.source(frame_num) == SOURCE_PROXY
+                continue
+            
+            # read_frames skips frames it cannot decode
+            if next_decoded is None or next_decoded[0] != frame_num:
+                continue
+            with metrics.timed('jpeg_encode'):
+                _, jpeg = cv2.imencode('.jpg', next_decoded[1])
+            next_decoded = next(decoded, None)
+            if segment is not None:
+                metrics.cache_result('frame_store', False)
+                segment.append(frame_num, jpeg, SOURCE_PROXY if from_proxy else SOURCE_ORIGINAL)
+            yield frame_num, jpeg, from_proxy
+    finally:
+        decoded.close()
+        if segment is not None:
+            segment.flush()
+
+def extract_frames(video_path, start_time, duration=30, target_fps=30, proxy_path=None, segment=None, frame_buffer=None,
+                   every_nth=None, max_frames=None, roi=None):
+    """Extract frames from video, sampled as in segment_frame_nums.
+
+    With a frame store segment (held locked by the caller), frames stored by
+    earlier requests are reused and newly encoded ones are appended. With a
+    frame_buffer, which needs a segment, frames over its memory budget are
+    returned with 'spilled': True instead of base64 'data'. Frames decoded
+    from the proxy are tagged with 'source': 'proxy'. Frames are cropped to
+    roi if given.
+    """
+    timestamps = load_timestamp_index(video_path)
+    if timestamps is None:
+        return []
+    
+    frame_nums = segment_frame_nums(timestamps, start_time, duration, target_fps, every_nth, max_frames)
+    return encode_frames(video_path, timestamps, frame_nums, proxy_path, segment, frame_buffer, roi)
+
+def encode_frames(video_path, timestamps, frame_nums, proxy_path=None, segment=None, frame_buffer=None, roi=None):
+    """Decode the given frames in one forward pass into response dicts, as in extract_frames"""
+    encoded = iter_encoded_frames(video_path, timestamps, frame_nums, proxy_path, segment, roi)
+    return frame_responses(timestamps, encoded, frame_buffer)
+
+def frame_responses(timestamps, encoded, frame_buffer=None):
+    """Response dicts for (frame_num, jpeg, from_proxy) tuples, base64-encoded within frame_buffer"""
+    frames = []
+    for frame_num, jpeg, from_proxy in encoded:
+        frame_data = {
+            'frame_num': frame_num,
+            'time': float(timestamps[frame_num])
+        }
+        if from_proxy:
+            frame_data['source'] = 'proxy'
+        # Convert frame to base64 for web display
+        if frame_buffer is None or frame_buffer.reserve(jpeg):
+            with metrics.timed('base64'):
+                frame_data['data'] = base64.b64encode(jpeg).decode('utf-8')
+        else:
+            frame_buffer.spill(jpeg)
+            frame_data['spilled'] = True
+        frames.append(frame_data)
+    
     return frames
 
+def frame_store_key(video_info):
+    """Frame store key of a video's previews; frames cropped to an ROI are stored apart"""
+    key = video_cache_key(video_info['path'])
+    if video_info.get('roi'):
+        key += '-' + roi_digest(video_info['roi'])
+    return key
+
+def store_frames(video_info, frame_nums):
+    """Decode any of the given frames missing from the frame store.
+
+    Returns (segment, decoded count), or (None, 0) if the video cannot be read.
+    """
+    video_path = video_info['path']
+    timestamps = load_timestamp_index(video_path)
+    if timestamps is None:
+        return None, 0
+    
+    store_key = frame_store_key(video_info)
+    segment = frame_store.segment(store_key)
+    with segment.lock:
+        segment.refresh()
+        missing = [n for n in frame_nums if 0 <= n < len(timestamps) and not segment.has(n)]
+        for _ in iter_encoded_frames(video_path, timestamps, missing, get_proxy_path(video_info), segment,
+                                     video_info.get('roi')):
+            pass
+    if missing:
+        frame_store.evict(keep=store_key)
+    return segment, len(missing)
+
 def extract_timeline_thumbnails(video_path, num_thumbnails=20):
     """Extract a set of thumbnails for the entire video timeline."""
     cap = cv2.VideoCapture(video_path)
@@ -135,131 +794,247 @@ def extract_timeline_thumbnails(video_path, num_thumbnails=20):
     cap.release()
     return thumbnails
 
+def transcode_proxy(video_path, proxy_path, max_height=PROXY_MAX_HEIGHT):
+    """Transcode a video into an all-intra MJPEG proxy for cheap random access.
+
+    Every source frame is written so proxy frame numbers match the original.
+    The proxy is written to a temporary name and renamed once complete.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return False
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if width == 0 or height == 0:
+        cap.release()
+        return False
+
+    if height > max_height:
+        width = int(round(width * max_height / height / 2)) * 2
+        height = max_height
+
+    partial_path = proxy_path + '.part.avi'
+    writer = cv2.VideoWriter(partial_path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    if not writer.isOpened():
+        cap.release()
+        return False
+    writer.set(cv2.VIDEOWRITER_PROP_QUALITY, PROXY_JPEG_QUALITY)
+
+    # The transcode decodes every frame anyway, so record the timestamp index too
+    timestamps = []
+    try:
+        while not shutdown_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+            if frame.shape[0] != height:
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            writer.write(frame)
+    finally:
+        writer.release()
+        cap.release()
+
+    if not timestamps or shutdown_event.is_set():
+        os.remove(partial_path)
+        return False
+
+    if not os.path.exists(timestamp_index_path(video_path)):
+        save_timestamp_index(video_path, _checked_timestamps(timestamps, fps))
+    os.replace(partial_path, proxy_path)
+    proxy_fps_cache[proxy_path] = fps
+    return True
+
+def _run_proxy_job(video_id, video_path):
+    proxy_path = os.path.join(PROXY_FOLDER, f'{video_id}.avi')
+    try:
+        success = transcode_proxy(video_path, proxy_path)
+    except Exception as e:
+        logger.exception('Proxy transcode failed', extra={'video_id': video_id})
+        success = False
+
+    if success:
+        status = 'ready'
+    elif shutdown_event.is_set():
+        status = 'cancelled'
+    else:
+        status = 'failed'
+    session_store.update_video(video_id, proxy_status=status, proxy_path=proxy_path if success else None)
+    if success:
+        evict_proxies(keep=proxy_path)
+
+def evict_proxies(keep=None):
+    """Delete least recently used proxies until PROXY_FOLDER fits PROXY_BUDGET"""
+    entries = []
+    for name in os.listdir(PROXY_FOLDER):
+        path = os.path.join(PROXY_FOLDER, name)
+        # Transcodes still in progress are written to .part files
+        if name.endswith('.part.avi'):
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, path, stat.st_size))
+    
+    total = sum(size for _, _, size in entries)
+    evicted = []
+    for _, path, size in sorted(entries):
+        if total <= PROXY_BUDGET:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        proxy_fps_cache.pop(path, None)
+        total -= size
+        evicted.append(path)
+    if evicted:
+        logger.info('Evicted proxies', extra={'proxies': len(evicted), 'bytes': total})
+    return evicted
+
+def schedule_proxy(video_id, video_path):
+    """Queue a background proxy transcode for a newly added video"""
+    if not PROXY_ENABLED or shutdown_event.is_set():
+        return
+    session_store.update_video(video_id, proxy_status='pending', proxy_path=None)
+    future = proxy_executor.submit(_run_proxy_job, video_id, video_path)
+    proxy_futures[video_id] = future
+    metrics.PROXY_QUEUE_DEPTH.inc()
+    
+    def on_done(_):
+        proxy_futures.pop(video_id, None)
+        metrics.PROXY_QUEUE_DEPTH.dec()
+    future.add_done_callback(on_done)
+
+def shutdown_background_jobs():
+    """Stop background work before the process exits.
+
+    Queued proxy transcodes are cancelled and running ones stop at the next
+    frame. Their videos are marked 'cancelled' and re-queued the next time
+    they are opened.
+    """
+    shutdown_event.set()
+    for video_id, future in list(proxy_futures.items()):
+        if future.cancel():
+            session_store.update_video(video_id, proxy_status='cancelled')
+    proxy_executor.shutdown(wait=True)
+
+def get_proxy_path(video_info):
+    """Return the proxy path for a video if its transcode has finished"""
+    proxy_path = video_info.get('proxy_path')
+    if video_info.get('proxy_status') == 'ready' and proxy_path and os.path.exists(proxy_path):
+        # The mtime records last use for evict_proxies
+        try:
+            os.utime(proxy_path)
+        except FileNotFoundError:
+            return None
+        return proxy_path
+    return None
+
+def roboflow_project(api_key, project_url):
+    """A RoboflowProject client for ROBOFLOW_API_URL; raises ValueError for a malformed URL"""
+    return RoboflowProject(
+        api_key, project_url, ROBOFLOW_API_URL,
+        validation_ttl=ROBOFLOW_VALIDATION_TTL,
+        retries=ROBOFLOW_UPLOAD_RETRIES,
+        backoff=ROBOFLOW_BACKOFF,
+        backoff_max=ROBOFLOW_BACKOFF_MAX,
+        timeout=ROBOFLOW_TIMEOUT
+    )
+
 def test_roboflow_connection(api_key, project_url):
     """Test if Roboflow connection is valid"""
     try:
-        # Extract workspace and project from URL
-        project_url = project_url.rstrip('/')
-        
-        if 'roboflow.com' in project_url:
-            parts = project_url.split('/')
-            for i, part in enumerate(parts):
-                if 'roboflow.com' in part and i + 2 < len(parts):
-                    workspace = parts[i + 1]
-                    project = parts[i + 2]
-                    break
-            else:
-                return False, "Could not parse workspace and project from URL"
-        else:
-            return False, "Invalid Roboflow URL format"
-        
-        # Test API endpoint - get project info
-        test_url = f"https://api.roboflow.com/{workspace}/{project}"
-        
-        params = {
-            'api_key': api_key
-        }
-        
-        response = requests.get(test_url, params=params)
-        
-        if response.status_code == 200:
-            return True, f"Connected to {workspace}/{project}"
-        else:
-            return False, f"Invalid project or API key: {response.text}"
-            
-    except Exception as e:
-        return False, f"Connection error: {str(e)}"
+        project = roboflow_project(api_key, project_url)
+    except ValueError as e:
+        return False, str(e)
+    return project.validate()
 
 def upload_to_roboflow_api(api_key, project_url, image_data, image_name, split='train', batch_name=None):
-    """Upload image to Roboflow project with optional batch name and split"""
+    """Upload one image to a Roboflow project; batches should reuse a roboflow_project() client"""
     try:
-        # Extract workspace and project from URL
-        project_url = project_url.rstrip('/')
-        
-        if 'roboflow.com' in project_url:
-            parts = project_url.split('/')
-            for i, part in enumerate(parts):
-                if 'roboflow.com' in part and i + 2 < len(parts):
-                    workspace = parts[i + 1]
-                    project = parts[i + 2]
-                    break
-            else:
-                return False, "Could not parse workspace and project from URL"
+        project = roboflow_project(api_key, project_url)
+    except ValueError as e:
+        return False, str(e)
+    return project.upload(image_data, image_name, split=split, batch_name=batch_name)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.request_id = request.headers.get('X-Request-Id') or uuid.uuid4().hex[:16]
+    g.request_id_token = current_request_id.set(g.request_id)
+    
+    # Admin opt-in: stage breakdown in Server-Timing plus a saved cProfile
+    if profiling.wants_profile(request):
+        g.stage_timings = {}
+        g.profiler = profiling.start()
+
+@app.after_request
+def record_request_time(response):
+    elapsed = time.perf_counter() - g.request_started if 'request_started' in g else None
+    if request.endpoint and elapsed is not None:
+        metrics.REQUEST_SECONDS.labels(request.endpoint).observe(elapsed)
+    if 'request_id' in g:
+        response.headers['X-Request-Id'] = g.request_id
+    
+    if 'stage_timings' in g:
+        response.headers['Server-Timing'] = profiling.server_timing(g.stage_timings, elapsed or 0)
+        profiler = g.pop('profiler', None)
+        if profiler:
+            profile_id = profiling.stop(profiler, request.endpoint or 'unknown', g.get('thread_profiles', ()))
+            response.headers['X-Profile-Id'] = profile_id
+            response.headers['X-Profile-Url'] = f'/profiles/{profile_id}'
         else:
-            return False, "Invalid Roboflow URL format"
-        
-        # Correct Roboflow Upload API endpoint format
-        upload_url = f"https://api.roboflow.com/dataset/{project}/upload"
-        
-        # Convert base64 to image file
-        image_bytes = base64.b64decode(image_data)
-        
-        # Save temporarily to ensure proper file upload
-        import tempfile
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp_file:
-            tmp_file.write(image_bytes)
-            tmp_path = tmp_file.name
-        
-        try:
-            # Prepare the multipart upload
-            with open(tmp_path, 'rb') as f:
-                files = {
-                    'file': (image_name, f, 'image/jpeg')
-                }
-                
-                # Parameters as query string
-                params = {
-                    'api_key': api_key,
-                    'name': image_name,
-                    'split': split # Use the provided split
-                }
-                
-                # Add batch name if provided
-                if batch_name:
-                    params['batch'] = batch_name
-                
-                print(f"Uploading to: {upload_url}")
-                print(f"Project: {project}")
-                print(f"Image name: {image_name}")
-                print(f"Split: {split}")
-                if batch_name:
-                    print(f"Batch name: {batch_name}")
-                
-                response = requests.post(
-                    upload_url,
-                    files=files,
-                    params=params
-                )
-                
-                print(f"Response status: {response.status_code}")
-                print(f"Response text: {response.text[:200]}...")
-                
-                if response.status_code == 200:
-                    # Check if response indicates success
-                    try:
-                        result = response.json()
-                        if 'error' in result:
-                            return False, f"Upload error: {result['error']}"
-                        elif 'success' in result and result['success']:
-                            return True, "Image uploaded successfully"
-                        elif 'id' in result:  # Some endpoints return an ID on success
-                            return True, f"Image uploaded successfully (ID: {result['id']})"
-                        else:
-                            # If no error and status is 200, assume success
-                            return True, "Image uploaded successfully"
-                    except:
-                        # If can't parse JSON but got 200, assume success
-                        return True, "Image uploaded successfully"
-                else:
-                    return False, f"Failed to upload (Status {response.status_code}): {response.text}"
-        finally:
-            # Clean up temp file
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-                
-    except Exception as e:
-        print(f"Exception during upload: {str(e)}")
-        return False, f"Error uploading to Roboflow: {str(e)}"
+            response.headers['X-Profile-Id'] = 'busy'
+    return response
+
+@app.teardown_request
+def stop_abandoned_profiler(exc):
+    # after_request is skipped when a view raises; don't leave the profiler running
+    profiler = g.pop('profiler', None)
+    if profiler:
+        profiling.stop(profiler)
+    # Server threads are reused, so don't let the id leak into the next request's logs
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        current_request_id.reset(token)
+
+@app.route('/profiles')
+def list_profiles():
+    """List saved request profiles (admin only)"""
+    if not profiling.is_admin(request):
+        return 'Forbidden', 403
+    return jsonify({'success': True, 'profiles': profiling.list_profiles()})
+
+@app.route('/profiles/<profile_id>')
+def download_profile(profile_id):
+    """Download a saved profile as pstats (default) or callgrind (admin only)"""
+    if not profiling.is_admin(request):
+        return 'Forbidden', 403
+    
+    path = profiling.profile_path(profile_id)
+    if not os.path.exists(path):
+        return 'Profile not found', 404
+    
+    if request.args.get('format') == 'callgrind':
+        return Response(
+            profiling.to_callgrind(profile_id),
+            mimetype='text/plain',
+            headers={'Content-Disposition': f'attachment; filename=callgrind.out.{profile_id}'}
+        )
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=f'{profile_id}.pstats')
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for the extraction, save and upload paths"""
+    metrics.QUEUED_VIDEOS.set(session_store.count_videos())
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
 
 @app.route('/test_roboflow', methods=['POST'])
 def test_roboflow_endpoint():
@@ -280,17 +1055,13 @@ def get_video_info():
     data = request.json
     video_id = data.get('video_id')
     
-    print(f"Getting video info for ID: {video_id}")
-    
-    if not video_id or 'videos' not in session or video_id not in session['videos']:
-        print(f"Video not found in session. Session videos: {session.get('videos', {}).keys()}")
+    video_info = get_session_video(video_id)
+    if not video_info:
+        logger.info('Video not found in session', extra={'video_id': video_id})
         return jsonify({'success': False, 'error': 'Video not found in session'})
     
-    video_info = session['videos'][video_id]
     video_path = video_info['path']
     
-    print(f"Video path: {video_path}")
-    
     if not os.path.exists(video_path):
         # Try to find the file with different extensions
         possible_paths = [
@@ -308,26 +1079,34 @@ def get_video_info():
         
         if found_path:
             video_path = found_path
-            # Update session with correct path
-            session['videos'][video_id]['path'] = video_path
-            session.modified = True
-            print(f"Updated video path to: {video_path}")
+            # Update the stored entry with the correct path
+            session_store.update_video(video_id, path=video_path)
+            logger.info('Updated video path', extra={'video_id': video_id, 'path': video_path})
         else:
-            print(f"Video file not found. Tried paths: {possible_paths}")
+            logger.warning('Video file not found', extra={'video_id': video_id, 'tried': possible_paths})
             return jsonify({'success': False, 'error': f'Video file not found'})
     
-    # Get video duration
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        print(f"Cannot open video file: {video_path}")
+    # Proxies interrupted by a server shutdown, or evicted over PROXY_BUDGET,
+    # are re-queued on next open
+    proxy_status = video_info.get('proxy_status')
+    proxy_evicted = proxy_status == 'ready' and not get_proxy_path(video_info)
+    if proxy_status == 'cancelled' or proxy_evicted:
+        schedule_proxy(video_id, video_path)
+        video_info = get_session_video(video_id)
+    
+    metadata = probe_video(video_path)
+    timestamps = load_timestamp_index(video_path) if metadata else None
+    if timestamps is None:
+        logger.warning('Cannot open video file', extra={'video_id': video_id, 'path': video_path})
         return jsonify({'success': False, 'error': 'Cannot open video file'})
     
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = frame_count / fps if fps > 0 else 0
-    cap.release()
+    # Duration and frame rate come from the timestamp index that frames are
+    # sampled by, not the container header, which is wrong for VFR video
+    fps = index_fps(timestamps)
+    frame_count = len(timestamps)
+    duration = frame_count / fps
     
-    print(f"Video info - FPS: {fps}, Frames: {frame_count}, Duration: {duration}")
+    logger.debug('Video info', extra={'video_id': video_id, 'fps': fps, 'frames': frame_count, 'duration': duration})
     
     # Ensure duration is valid
     if duration <= 0:
@@ -337,30 +1116,56 @@ def get_video_info():
         'success': True,
         'duration': duration,
         'fps': fps,
-        'frame_count': frame_count
+        'frame_count': frame_count,
+        'width': metadata['width'],
+        'height': metadata['height'],
+        'roi': video_info.get('roi'),
+        'proxy_status': video_info.get('proxy_status', 'none')
     })
 
+@app.route('/set_roi', methods=['POST'])
+def set_roi():
+    """Set a video's ROI, cropping its frames right after decode; roi: null clears it"""
+    data = request.json
+    video_id = data.get('video_id')
+    
+    video_info = get_session_video(video_id)
+    if not video_info or not os.path.exists(video_info['path']):
+        return jsonify({'success': False, 'error': 'Video not found'})
+    
+    roi = None
+    if data.get('roi'):
+        metadata = probe_video(video_info['path'])
+        if not metadata:
+            return jsonify({'success': False, 'error': 'Cannot open video file'})
+        try:
+            roi = parse_roi(data['roi'], metadata['width'], metadata['height'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)})
+    
+    if roi != video_info.get('roi'):
+        # Previews cropped to the old ROI are no longer reachable
+        frame_store.remove(frame_store_key(video_info))
+        session_store.update_video(video_id, roi=roi)
+    logger.info('Set ROI', extra={'video_id': video_id, 'roi': roi})
+    return jsonify({'success': True, 'roi': roi})
+
 @app.route('/video/<video_id>')
 def serve_video(video_id):
     """Serve video file for preview"""
-    if 'videos' not in session or video_id not in session['videos']:
+    video_info = get_session_video(video_id)
+    if not video_info:
         return 'Video not found', 404
     
-    video_info = session['videos'][video_id]
     video_path = video_info['path']
     
     if not os.path.exists(video_path):
         return 'Video file not found', 404
     
-    def generate():
-        with open(video_path, 'rb') as f:
-            data = f.read(1024)
-            while data:
-                yield data
-                data = f.read(1024)
-    
-    response = Response(generate(), mimetype='video/mp4')
+    # Range requests let the browser seek without downloading the whole file
+    response = send_file(os.path.abspath(video_path), mimetype='video/mp4', conditional=True)
     response.headers['Accept-Ranges'] = 'bytes'
+    metrics.VIDEO_BYTES_SERVED.inc(response.content_length or 0)
     return response
 
 @app.route('/')
@@ -538,7 +1343,7 @@ def index():
             border-radius: 1px;
         }
 
-        input[type="text"], input[type="file"], input[type="number"], input[type="password"], select {
+        input[type="text"], input[type="file"], input[type="number"], input[type="password"], select, textarea {
             width: 100%;
             padding: 18px 20px;
             border: 2px solid #e8ecef;
@@ -560,7 +1365,7 @@ def index():
              padding-right: 50px;
         }
 
-        input[type="text"]:focus, input[type="file"]:focus, input[type="number"]:focus, input[type="password"]:focus, select:focus {
+        input[type="text"]:focus, input[type="file"]:focus, input[type="number"]:focus, input[type="password"]:focus, select:focus, textarea:focus {
             outline: none;
             border-color: #667eea;
             background: white;
@@ -848,12 +1653,27 @@ def index():
             font-weight: 600;
         }
 
+        .segment-controls input[type="checkbox"] {
+            width: auto;
+            margin-right: 8px;
+        }
+
+        .review-video {
+            position: absolute;
+            width: 1px;
+            height: 1px;
+            opacity: 0;
+            pointer-events: none;
+        }
+
         .frame-display {
             text-align: center;
             margin: 35px 0;
         }
 
-        .frame-display img {
+        .frame-display canvas {
+            width: auto;
+            height: auto;
             max-width: 100%;
             max-height: 550px;
             border: 4px solid #e8ecef;
@@ -862,7 +1682,7 @@ def index():
             box-shadow: 0 16px 50px rgba(0, 0, 0, 0.12);
         }
 
-        .frame-display img.selected {
+        .frame-display canvas.selected {
             border-color: #27ae60;
             box-shadow: 0 0 40px rgba(39, 174, 96, 0.5), 0 20px 60px rgba(0, 0, 0, 0.15);
             transform: scale(1.02);
@@ -1342,6 +2162,34 @@ def index():
                         <option value="test">Test</option>
                     </select>
                 </div>
+
+                <div class="input-group">
+                    <label for="roboflow-max-size">Upload Max Size (px, Optional):</label>
+                    <input type="number" id="roboflow-max-size" min="32" step="1" placeholder="Native resolution">
+                </div>
+
+                <div class="input-group">
+                    <label for="roboflow-quality">Upload Quality (1-100, Optional):</label>
+                    <input type="number" id="roboflow-quality" min="1" max="100" step="1" placeholder="Browser JPEG">
+                </div>
+
+                <div class="input-group">
+                    <label for="roboflow-format">Upload Format:</label>
+                    <select id="roboflow-format">
+                        <option value="jpg" selected>JPEG</option>
+                        <option value="webp">WebP</option>
+                        <option value="png">PNG</option>
+                    </select>
+                </div>
+
+                <div class="input-group">
+                    <label for="roboflow-dedupe">Near-Duplicate Frames:</label>
+                    <select id="roboflow-dedupe">
+                        <option value="" selected>Upload all</option>
+                        <option value="flag">Upload and flag</option>
+                        <option value="skip">Skip</option>
+                    </select>
+                </div>
             </div>
             
             <div class="button-group">
@@ -1367,6 +2215,15 @@ def index():
                 <button onclick="addYouTubeVideo()">Add YouTube Video</button>
                 <button onclick="uploadFile()">Upload File</button>
             </div>
+            
+            <div class="input-group">
+                <label for="bulk-sources">Bulk add (one YouTube URL or server path/glob per line):</label>
+                <textarea id="bulk-sources" rows="4" placeholder="https://www.youtube.com/watch?v=...&#10;clips/**/*.mp4"></textarea>
+            </div>
+            
+            <div class="button-group">
+                <button onclick="addBatch()">Add All</button>
+            </div>
         </div>
         
         <div class="video-list" id="video-list" style="display: none;">
@@ -1404,6 +2261,19 @@ def index():
                     <input type="number" id="duration" min="1" max="60" value="30" step="1">
                     <button onclick="updateSegmentFromInputs()">Update</button>
                     <button onclick="loadSegment()">Load Frames</button>
+                    <label title="Step through frames with the browser's video decoder; only selected frames are extracted on the server">
+                        <input type="checkbox" id="browser-review" onchange="setBrowserReview(this.checked)">Decode previews in browser
+                    </label>
+                </div>
+                
+                <div class="segment-controls">
+                    <label title="Crop every frame of this video to this rectangle (source pixels) right after decode">ROI:</label>
+                    <input type="text" id="roi-rect" placeholder="x,y,w,h">
+                    <label title="Resize the cropped frames; leave empty to keep the crop size">Output size:</label>
+                    <input type="text" id="roi-output" placeholder="WxH">
+                    <button onclick="applyRoi()">Set ROI</button>
+                    <button onclick="clearRoi()">Clear</button>
+                    <span id="video-size"></span>
                 </div>
             </div>
             
@@ -1422,7 +2292,8 @@ def index():
                 <div class="frame-info" id="frame-info"></div>
                 
                 <div class="frame-display">
-                    <img id="frame-image" src="" alt="Video frame">
+                    <canvas id="frame-canvas" aria-label="Video frame"></canvas>
+                    <video id="review-video" class="review-video" muted playsinline preload="auto"></video>
                 </div>
                 
                 <div class="frame-controls">
@@ -1440,6 +2311,24 @@ def index():
         </div>
     </div>
     
+    <script id="frame-worker-source" type="text/js-worker">
+        // Fetches frames as binary and decodes them off the main thread.
+        // The worker's own base URL is blob:, so frame paths are resolved
+        // against the page's URL, which is sent with each request.
+        self.onmessage = async (event) => {
+            const { url, base } = event.data;
+            try {
+                const response = await fetch(new URL(url, base));
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                const bitmap = await createImageBitmap(await response.blob());
+                self.postMessage({ url, bitmap }, [bitmap]);
+            } catch (error) {
+                self.postMessage({ url, error: error.message });
+            }
+        };
+    </script>
     <script>
 
         
@@ -1450,7 +2339,47 @@ def index():
         let frames = [];
         let currentFrameIndex = 0;
         let selectedFrames = new Set();
+        
+        // Lazy viewer: frames within FRAME_WINDOW of the current one are
+        // prefetched in batches, in the direction of travel first. A worker
+        // decodes them to ImageBitmaps, kept in an LRU keyed by frame URL
+        // (Map insertion order) and drawn straight to the canvas.
+        const FRAME_WINDOW = 20;
+        const PREFETCH_BATCH = 10;
+        const BITMAP_CACHE_SIZE = 2 * FRAME_WINDOW + 8;
+        let frameBitmaps = new Map();
+        let pendingFrames = new Set();
+        let frameDirection = 1;
+        let prefetchGeneration = 0;
+        
+        // Browser review mode: a hidden <video> is seeked to the server's frame
+        // timestamps and drawn to the canvas, so previews cost the server nothing;
+        // only the frames selected for saving are extracted server-side
+        let browserReview = localStorage.getItem('browserReview') === 'true';
+        let reviewUnsupported = false;
+        let reviewSeekToken = 0;
+        
+        const frameWorker = new Worker(URL.createObjectURL(new Blob(
+            [document.getElementById('frame-worker-source').textContent],
+            { type: 'text/javascript' }
+        )));
+        frameWorker.onmessage = (event) => {
+            const { url, bitmap, error } = event.data;
+            pendingFrames.delete(url);
+            if (error) {
+                console.error('Frame decode failed:', url, error);
+                if (frames.length && frameUrl(frames[currentFrameIndex]) === url) {
+                    showToast('Could not load frame: ' + error, 'error');
+                }
+                return;
+            }
+            cacheBitmap(url, bitmap);
+            if (frames.length && frameUrl(frames[currentFrameIndex]) === url) {
+                drawBitmap(bitmap);
+            }
+        };
         let currentVideoId = null;
+        let currentRoi = null;
         let videoDuration = 0;
         let segmentStart = 0;
         let segmentDuration = 30;
@@ -1461,6 +2390,10 @@ def index():
             apiKey: '',
             batchName: '',
             split: 'train',
+            dedupe: '',
+            uploadMaxSize: '',
+            uploadQuality: '',
+            uploadFormat: 'jpg',
             isConfigured: false
         };
         
@@ -1540,6 +2473,10 @@ def index():
                 document.getElementById('roboflow-api-key').value = roboflowConfig.apiKey || '';
                 document.getElementById('roboflow-batch-name').value = roboflowConfig.batchName || '';
                 document.getElementById('roboflow-split').value = roboflowConfig.split || 'train';
+                document.getElementById('roboflow-dedupe').value = roboflowConfig.dedupe || '';
+                document.getElementById('roboflow-max-size').value = roboflowConfig.uploadMaxSize || '';
+                document.getElementById('roboflow-quality').value = roboflowConfig.uploadQuality || '';
+                document.getElementById('roboflow-format').value = roboflowConfig.uploadFormat || 'jpg';
                 updateRoboflowStatus();
             }
         }
@@ -1550,6 +2487,10 @@ def index():
             const apiKey = document.getElementById('roboflow-api-key').value.trim();
             const batchName = document.getElementById('roboflow-batch-name').value.trim();
             const split = document.getElementById('roboflow-split').value;
+            const dedupe = document.getElementById('roboflow-dedupe').value;
+            const uploadMaxSize = document.getElementById('roboflow-max-size').value;
+            const uploadQuality = document.getElementById('roboflow-quality').value;
+            const uploadFormat = document.getElementById('roboflow-format').value;
             
             if (!url || !apiKey) {
                 showToast('Please enter both Roboflow project URL and API key', 'error');
@@ -1561,6 +2502,10 @@ def index():
                 apiKey: apiKey,
                 batchName: batchName,
                 split: split,
+                dedupe: dedupe,
+                uploadMaxSize: uploadMaxSize,
+                uploadQuality: uploadQuality,
+                uploadFormat: uploadFormat,
                 isConfigured: true
             };
             
@@ -1624,10 +2569,38 @@ def index():
             }
         }
         
+        // Restore the video queue kept on the server for this session
+        async function loadQueue() {
+            try {
+                const response = await fetch('/queue');
+                const data = await response.json();
+                if (data.success) {
+                    videos = data.videos;
+                    updateVideoList();
+                }
+            } catch (error) {
+                console.error('Failed to load video queue:', error);
+            }
+        }
+        
         // Initialize on page load
         window.addEventListener('load', () => {
             loadRoboflowConfig();
             initializeTimeline();
+            loadQueue();
+            document.getElementById('browser-review').checked = browserReview;
+            
+            // Fall back to server-side previews for videos the browser can't decode
+            document.getElementById('review-video').addEventListener('error', () => {
+                if (!currentVideoId) return;
+                reviewUnsupported = true;
+                if (browserReview) {
+                    showToast('This video cannot be decoded in the browser; using server previews', 'warning');
+                    if (frames.length) {
+                        displayFrame();
+                    }
+                }
+            });
         });
         
         // Keyboard event listeners
@@ -1879,6 +2852,56 @@ def index():
             }
         }
         
+        async function addBatch() {
+            const lines = document.getElementById('bulk-sources').value
+                .split('\n')
+                .map(line => line.trim())
+                .filter(line => line);
+            const button = event.target;
+            
+            if (!lines.length) {
+                showToast('Please enter at least one URL or path', 'error');
+                return;
+            }
+            
+            const urls = lines.filter(line => /^https?:\/\//.test(line));
+            const paths = lines.filter(line => !/^https?:\/\//.test(line));
+            
+            setButtonLoading(button, true);
+            const progressToast = showToast(`Adding ${lines.length} source(s)...`, 'info', 0, true);
+            
+            try {
+                const response = await fetch('/add_batch', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ urls: urls, paths: paths })
+                });
+                
+                const data = await response.json();
+                removeToast(progressToast);
+                
+                if (data.videos && data.videos.length) {
+                    data.videos.forEach(video => videos.push({ id: video.id, name: video.name, type: video.type }));
+                    updateVideoList();
+                    document.getElementById('bulk-sources').value = '';
+                }
+                
+                if (data.errors && data.errors.length) {
+                    showToast(`Added ${data.videos.length} video(s), ${data.errors.length} failed: ` +
+                              data.errors.map(e => `${e.source} (${e.error})`).join(', '), 'warning', 10000);
+                } else if (data.success) {
+                    showToast(`Added ${data.videos.length} video(s)`, 'success');
+                } else {
+                    showToast(data.error || 'Failed to add videos', 'error');
+                }
+            } catch (error) {
+                removeToast(progressToast);
+                showToast('Error adding videos: ' + error.message, 'error');
+            } finally {
+                setButtonLoading(button, false);
+            }
+        }
+        
         function updateVideoList() {
             const videoList = document.getElementById('video-list');
             const videoItems = document.getElementById('video-items');
@@ -1896,9 +2919,19 @@ def index():
             }
         }
         
-        function removeVideo(index) {
-            videos.splice(index, 1);
+        async function removeVideo(index) {
+            const [video] = videos.splice(index, 1);
             updateVideoList();
+            
+            try {
+                await fetch('/remove_video', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ video_id: video.id })
+                });
+            } catch (error) {
+                console.error('Failed to remove video:', error);
+            }
         }
         
         function startProcessing() {
@@ -1928,6 +2961,7 @@ def index():
             const video = videos[currentVideoIndex];
             currentVideoId = video.id;
             document.getElementById('current-video-title').textContent = `Processing: ${video.name}`;
+            clearFrameWindow();
             frames = [];
             currentFrameIndex = 0;
             selectedFrames.clear();
@@ -1948,10 +2982,14 @@ def index():
                 if (infoData.success) {
                     videoDuration = infoData.duration;
                     document.getElementById('video-duration').textContent = `Duration: ${formatTime(videoDuration)}`;
+                    document.getElementById('video-size').textContent = `Frame: ${infoData.width}x${infoData.height}`;
+                    setRoi(infoData.roi);
                     
                     const videoPlayer = document.getElementById('video-player');
                     videoPlayer.src = `/video/${currentVideoId}`;
                     videoPlayer.load();
+                    reviewUnsupported = false;
+                    updateReviewSource();
 
                     videoPlayer.addEventListener('loadedmetadata', () => {
                         segmentStart = 0;
@@ -1998,14 +3036,17 @@ def index():
                     body: JSON.stringify({
                         video_id: currentVideoId,
                         start_time: segmentStart,
-                        duration: segmentDuration
+                        duration: segmentDuration,
+                        lazy: true
                     })
                 });
                 
                 const data = await response.json();
                 if (data.success) {
+                    clearFrameWindow();
                     frames = data.frames;
                     currentFrameIndex = 0;
+                    frameDirection = 1;
                     selectedFrames.clear();
                     document.getElementById('loading').style.display = 'none';
                     document.getElementById('frame-viewer').style.display = 'block';
@@ -2025,13 +3066,23 @@ def index():
             if (!frames.length) return;
             
             const frame = frames[currentFrameIndex];
-            const img = document.getElementById('frame-image');
-            img.src = `data:image/jpeg;base64,${frame.data}`;
+            const url = frameUrl(frame);
+            const bitmap = frameBitmaps.get(url);
+            if (usingVideoReview() && frame.url) {
+                showVideoFrame(frame);
+            } else if (bitmap) {
+                cacheBitmap(url, bitmap);
+                drawBitmap(bitmap);
+            } else {
+                // Drawn by the worker's reply; /frame decodes it if it wasn't prefetched
+                requestBitmap(url);
+            }
             
+            const canvas = document.getElementById('frame-canvas');
             if (selectedFrames.has(currentFrameIndex)) {
-                img.classList.add('selected');
+                canvas.classList.add('selected');
             } else {
-                img.classList.remove('selected');
+                canvas.classList.remove('selected');
             }
             
             const info = document.getElementById('frame-info');
@@ -2045,11 +3096,222 @@ def index():
             const progressFill = document.getElementById('progress-fill');
             progressFill.style.width = `${progress}%`;
             progressFill.textContent = `${Math.round(progress)}%`;
+            
+            if (!usingVideoReview()) {
+                updateFrameWindow();
+            }
+        }
+        
+        function setRoi(roi) {
+            currentRoi = roi || null;
+            document.getElementById('roi-rect').value = currentRoi ?
+                `${currentRoi.x},${currentRoi.y},${currentRoi.width},${currentRoi.height}` : '';
+            document.getElementById('roi-output').value = currentRoi && currentRoi.output_width ?
+                `${currentRoi.output_width}x${currentRoi.output_height}` : '';
+        }
+        
+        async function applyRoi() {
+            const rect = document.getElementById('roi-rect').value.trim();
+            const output = document.getElementById('roi-output').value.trim();
+            let roi = null;
+            if (rect) {
+                const [x, y, width, height] = rect.split(',').map(v => parseInt(v, 10));
+                const [outputWidth, outputHeight] = output ? output.toLowerCase().split('x').map(v => parseInt(v, 10)) : [];
+                roi = { x, y, width, height, output_width: outputWidth || null, output_height: outputHeight || null };
+            }
+            await saveRoi(roi);
+        }
+        
+        async function clearRoi() {
+            await saveRoi(null);
+        }
+        
+        async function saveRoi(roi) {
+            if (!currentVideoId) return;
+            try {
+                const response = await fetch('/set_roi', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ video_id: currentVideoId, roi })
+                });
+                const data = await response.json();
+                if (!data.success) {
+                    showToast(data.error || 'Failed to set ROI', 'error');
+                    return;
+                }
+                setRoi(data.roi);
+                showToast(data.roi ? 'ROI set' : 'ROI cleared', 'success');
+                // Loaded frames were cropped to the previous ROI
+                if (frames.length) {
+                    loadSegment();
+                }
+            } catch (error) {
+                showToast('Error setting ROI: ' + error.message, 'error');
+            }
+        }
+        
+        function usingVideoReview() {
+            return browserReview && !reviewUnsupported;
+        }
+        
+        function setBrowserReview(enabled) {
+            browserReview = enabled;
+            localStorage.setItem('browserReview', enabled);
+            document.getElementById('browser-review').checked = enabled;
+            updateReviewSource();
+            if (frames.length) {
+                displayFrame();
+            }
+        }
+        
+        function updateReviewSource() {
+            // The hidden video preloads the whole file, so it is only given a
+            // source while browser review is on
+            const video = document.getElementById('review-video');
+            const src = browserReview && currentVideoId ? `/video/${currentVideoId}` : null;
+            if (video.getAttribute('src') === src) return;
+            if (src) {
+                video.src = src;
+            } else if (video.hasAttribute('src')) {
+                video.removeAttribute('src');
+                video.load();  // aborts any download in progress
+            }
+        }
+        
+        function showVideoFrame(frame) {
+            const video = document.getElementById('review-video');
+            const token = ++reviewSeekToken;
+            const draw = () => {
+                // Rapid scrubbing supersedes earlier seeks; only the latest draws
+                if (token !== reviewSeekToken) return;
+                const canvas = document.getElementById('frame-canvas');
+                let [sx, sy, sw, sh] = [0, 0, video.videoWidth, video.videoHeight];
+                let [width, height] = [sw, sh];
+                if (currentRoi) {
+                    // The ROI is in source pixels; scale it to the decoded size
+                    const scaleX = video.videoWidth / currentRoi.frame_width;
+                    const scaleY = video.videoHeight / currentRoi.frame_height;
+                    [sx, sy] = [currentRoi.x * scaleX, currentRoi.y * scaleY];
+                    [sw, sh] = [currentRoi.width * scaleX, currentRoi.height * scaleY];
+                    width = currentRoi.output_width || Math.round(sw);
+                    height = currentRoi.output_height || Math.round(sh);
+                }
+                if (canvas.width !== width || canvas.height !== height) {
+                    canvas.width = width;
+                    canvas.height = height;
+                }
+                canvas.getContext('2d').drawImage(video, sx, sy, sw, sh, 0, 0, width, height);
+            };
+            
+            // Land just inside the frame's display interval, not on its boundary
+            const target = frame.time + 0.001;
+            if (video.readyState >= 2 && Math.abs(video.currentTime - target) < 1e-6) {
+                draw();
+                return;
+            }
+            if ('requestVideoFrameCallback' in video) {
+                video.requestVideoFrameCallback(draw);
+            } else {
+                video.addEventListener('seeked', draw, { once: true });
+            }
+            video.currentTime = target;
+        }
+        
+        function frameUrl(frame) {
+            return frame.url || `data:image/jpeg;base64,${frame.data}`;
+        }
+        
+        function drawBitmap(bitmap) {
+            const canvas = document.getElementById('frame-canvas');
+            if (canvas.width !== bitmap.width || canvas.height !== bitmap.height) {
+                canvas.width = bitmap.width;
+                canvas.height = bitmap.height;
+            }
+            canvas.getContext('2d').drawImage(bitmap, 0, 0);
+        }
+        
+        function cacheBitmap(url, bitmap) {
+            // Re-inserting marks the entry most recently used
+            frameBitmaps.delete(url);
+            frameBitmaps.set(url, bitmap);
+            while (frameBitmaps.size > BITMAP_CACHE_SIZE) {
+                const oldest = frameBitmaps.keys().next().value;
+                frameBitmaps.get(oldest).close();
+                frameBitmaps.delete(oldest);
+            }
+        }
+        
+        function requestBitmap(url) {
+            if (!frameBitmaps.has(url) && !pendingFrames.has(url)) {
+                pendingFrames.add(url);
+                frameWorker.postMessage({ url, base: location.href });
+            }
+        }
+        
+        function clearFrameWindow() {
+            // Decoded bitmaps stay cached by URL; only the prefetch loop is stopped
+            prefetchGeneration++;
+        }
+        
+        function updateFrameWindow() {
+            // Ahead of the current frame first, then behind it
+            const wanted = [];
+            for (let offset = 1; offset <= FRAME_WINDOW; offset++) {
+                wanted.push(currentFrameIndex + offset * frameDirection);
+            }
+            for (let offset = 1; offset <= FRAME_WINDOW; offset++) {
+                wanted.push(currentFrameIndex - offset * frameDirection);
+            }
+            const missing = wanted.filter(index =>
+                index >= 0 && index < frames.length && frames[index].url &&
+                !frameBitmaps.has(frames[index].url) && !pendingFrames.has(frames[index].url));
+            if (missing.length) {
+                prefetchFrames(missing);
+            }
+        }
+        
+        async function prefetchFrames(indices) {
+            const generation = ++prefetchGeneration;
+            const segmentFrames = frames;
+            const videoId = currentVideoId;
+            
+            for (let i = 0; i < indices.length; i += PREFETCH_BATCH) {
+                // A newer window or segment supersedes this one
+                if (generation !== prefetchGeneration) return;
+                const batch = indices.slice(i, i + PREFETCH_BATCH).filter(index =>
+                    !frameBitmaps.has(segmentFrames[index].url) && !pendingFrames.has(segmentFrames[index].url));
+                if (!batch.length) continue;
+                
+                batch.forEach(index => pendingFrames.add(segmentFrames[index].url));
+                try {
+                    // Decode the batch in one pass on the server, then fetch the JPEGs in the worker
+                    await fetch('/prefetch_frames', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({
+                            video_id: videoId,
+                            frame_nums: batch.map(index => segmentFrames[index].frame_num)
+                        })
+                    });
+                } catch (error) {
+                    console.error('Frame prefetch failed:', error);
+                } finally {
+                    batch.forEach(index => pendingFrames.delete(segmentFrames[index].url));
+                }
+                if (frames !== segmentFrames) return;
+                
+                batch.forEach(index => {
+                    if (Math.abs(index - currentFrameIndex) <= FRAME_WINDOW) {
+                        requestBitmap(segmentFrames[index].url);
+                    }
+                });
+            }
         }
         
         function previousFrame() {
             if (currentFrameIndex > 0) {
                 currentFrameIndex--;
+                frameDirection = -1;
                 displayFrame();
             }
         }
@@ -2057,6 +3319,7 @@ def index():
         function nextFrame() {
             if (currentFrameIndex < frames.length - 1) {
                 currentFrameIndex++;
+                frameDirection = 1;
                 displayFrame();
             }
         }
@@ -2088,7 +3351,8 @@ def index():
                 const finalRoboflowConfig = {
                     ...roboflowConfig,
                     batchName: document.getElementById('roboflow-batch-name').value.trim(),
-                    split: document.getElementById('roboflow-split').value
+                    split: document.getElementById('roboflow-split').value,
+                    dedupe: document.getElementById('roboflow-dedupe').value
                 };
 
                 try {
@@ -2110,12 +3374,17 @@ def index():
                     removeToast(uploadToast);
                     
                     if (data.success) {
-                        let message = `Saved ${selectedFrames.size} frames to ${data.output_dir}`;
+                        let message = `Saved ${data.frame_count} frames to ${data.output_dir}`;
+                        if (data.skipped_frames) {
+                            message += ` (${data.skipped_frames} could not be read)`;
+                        }
                         let toastType = 'success';
                         
                         if (data.roboflow_results) {
-                            const uploaded = data.roboflow_results.filter(r => r.success).length;
+                            const uploaded = data.roboflow_results.filter(r => r.success && !r.skipped).length;
                             const failed = data.roboflow_results.filter(r => !r.success).length;
+                            const skipped = data.roboflow_results.filter(r => r.skipped).length;
+                            const flagged = data.roboflow_results.filter(r => r.duplicate_distance !== undefined && !r.skipped).length;
                             
                             if (failed > 0) {
                                 message += `. Roboflow: ${uploaded} uploaded, ${failed} failed`;
@@ -2123,6 +3392,12 @@ def index():
                             } else {
                                 message += `. All ${uploaded} frames uploaded to Roboflow successfully`;
                             }
+                            if (skipped > 0) {
+                                message += `, ${skipped} near-duplicates skipped`;
+                            }
+                            if (flagged > 0) {
+                                message += `, ${flagged} near-duplicates flagged`;
+                            }
                         }
                         
                         showToast(message, toastType, 10000);
@@ -2145,6 +3420,7 @@ def index():
             document.querySelector('.roboflow-section').style.display = 'block';
             videos = [];
             updateVideoList();
+            fetch('/cleanup', { method: 'POST' });
         }
     </script>
 </body>
@@ -2160,48 +3436,27 @@ def add_youtube():
     if not url:
         return jsonify({'success': False, 'error': 'No URL provided'})
     
-    video_id = str(uuid.uuid4())
-    base_path = os.path.join(TEMP_FOLDER, video_id)
-    
-    print(f"Downloading YouTube video: {url}")
+    success, video_or_error = fetch_youtube_video(url)
+    if not success:
+        return jsonify({'success': False, 'error': video_or_error})
     
-    success, title_or_error = download_youtube_video(url, base_path)
+    video_id = video_or_error['id']
+    video_path = video_or_error['path']
+    session_store.add_video(get_session_id(), video_id, {
+        'path': video_path,
+        'name': video_or_error['name'],
+        'type': 'youtube'
+    })
+    schedule_proxy(video_id, video_path)
     
-    if success:
-        video_path = None
-        if os.path.exists(TEMP_FOLDER):
-            for file in os.listdir(TEMP_FOLDER):
-                if file.startswith(video_id):
-                    video_path = os.path.join(TEMP_FOLDER, file)
-                    break
-        
-        if not video_path:
-            print(f"Downloaded file not found for base {video_id}")
-            return jsonify({'success': False, 'error': 'Downloaded file not found'})
-        
-        print(f"Video downloaded to: {video_path}")
-        
-        if 'videos' not in session:
-            session['videos'] = {}
-        
-        session['videos'][video_id] = {
-            'path': video_path,
-            'name': title_or_error if title_or_error else url,
+    return jsonify({
+        'success': True,
+        'video': {
+            'id': video_id,
+            'name': video_or_error['name'],
             'type': 'youtube'
         }
-        session.modified = True
-        
-        return jsonify({
-            'success': True,
-            'video': {
-                'id': video_id,
-                'name': title_or_error if title_or_error else url,
-                'type': 'youtube'
-            }
-        })
-    else:
-        print(f"Download failed: {title_or_error}")
-        return jsonify({'success': False, 'error': f'Failed to download: {title_or_error}'})
+    })
 
 @app.route('/upload_file', methods=['POST'])
 def upload_file():
@@ -2219,15 +3474,12 @@ def upload_file():
         video_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_{filename}')
         file.save(video_path)
         
-        if 'videos' not in session:
-            session['videos'] = {}
-        
-        session['videos'][video_id] = {
+        session_store.add_video(get_session_id(), video_id, {
             'path': video_path,
             'name': filename,
             'type': 'upload'
-        }
-        session.modified = True
+        })
+        schedule_proxy(video_id, video_path)
         
         return jsonify({
             'success': True,
@@ -2240,29 +3492,275 @@ def upload_file():
     else:
         return jsonify({'success': False, 'error': 'Invalid file type'})
 
+def resolve_import_paths(patterns):
+    """Expand relative paths, directories and globs into video files within IMPORT_ROOTS.
+
+    Returns ([(real path, path relative to its root)], errors). Patterns are
+    only globbed inside each root, and errors name the pattern as sent, so
+    nothing about files outside the roots is revealed.
+    """
+    roots = [os.path.realpath(root) for root in IMPORT_ROOTS]
+    paths = []
+    seen = set()
+    errors = []
+    
+    for pattern in patterns:
+        parts = pattern.replace('\\', '/').split('/')
+        if os.path.isabs(pattern) or '..' in parts:
+            errors.append({'source': pattern, 'error': 'Paths must be relative to an import directory'})
+            continue
+        
+        matched = False
+        for root in roots:
+            root_pattern = pattern
+            if os.path.isdir(os.path.join(root, pattern)):
+                root_pattern = os.path.join(pattern, '**', '*')
+            for match in sorted(glob.glob(root_pattern, root_dir=root, recursive=True)):
+                real_path = os.path.realpath(os.path.join(root, match))
+                # Symlinks inside a root may still point outside it
+                if os.path.commonpath([real_path, root]) != root:
+                    continue
+                if not os.path.isfile(real_path) or not allowed_file(real_path):
+                    continue
+                matched = True
+                if real_path not in seen:
+                    seen.add(real_path)
+                    paths.append((real_path, match))
+        if not matched:
+            errors.append({'source': pattern, 'error': 'No matching video files'})
+    
+    return paths, errors
+
+def _ingest_batch_item(item):
+    # source is what the client may see: the URL, or the path relative to its import root
+    kind, source, path = item
+    if kind == 'url':
+        success, video_or_error = fetch_youtube_video(source)
+        if not success:
+            return {'source': source, 'error': video_or_error}
+        video = video_or_error
+    else:
+        video = {
+            'id': str(uuid.uuid4()),
+            'path': path,
+            'name': os.path.basename(path),
+            'type': 'local'
+        }
+    
+    metadata = probe_video(video['path'])
+    if not metadata or metadata['duration'] <= 0:
+        if video['type'] == 'youtube':
+            os.remove(video['path'])
+        return {'source': source, 'error': 'Cannot read video metadata'}
+    
+    video['source'] = source
+    video.update(metadata)
+    return video
+
+@app.route('/add_batch', methods=['POST'])
+def add_batch():
+    """Register many videos in one call from YouTube URLs and/or server-side paths or globs"""
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'})
+    urls = data.get('urls') or []
+    patterns = data.get('paths') or []
+    
+    for name, values in (('urls', urls), ('paths', patterns)):
+        if not isinstance(values, list) or not all(isinstance(value, str) and value for value in values):
+            return jsonify({'success': False, 'error': f'{name} must be a list of strings'})
+    if not urls and not patterns:
+        return jsonify({'success': False, 'error': 'No URLs or paths provided'})
+    if len(urls) + len(patterns) > BATCH_MAX_ITEMS:
+        return jsonify({'success': False, 'error': f'At most {BATCH_MAX_ITEMS} URLs and paths per batch'})
+    
+    local_paths, errors = resolve_import_paths(patterns)
+    if len(urls) + len(local_paths) > BATCH_MAX_ITEMS:
+        return jsonify({'success': False, 'error': f'The paths match more than {BATCH_MAX_ITEMS} videos'})
+    items = [('url', url, None) for url in urls] + [('path', source, path) for path, source in local_paths]
+    
+    # Downloads and metadata probes run in parallel, each in a copy of this
+    # request's context so their logs carry its id; results keep input order
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, _ingest_batch_item, item) for item in items]
+        results = [future.result() for future in futures]
+    
+    videos = [result for result in results if 'error' not in result]
+    errors.extend(result for result in results if 'error' in result)
+    
+    session_store.add_videos(get_session_id(), [
+        (video['id'], {'path': video['path'], 'name': video['name'], 'type': video['type']})
+        for video in videos
+    ])
+    for video in videos:
+        schedule_proxy(video['id'], video['path'])
+    
+    return jsonify({
+        'success': bool(videos),
+        'videos': [
+            {key: value for key, value in video.items() if key != 'path'}
+            for video in videos
+        ],
+        'errors': errors
+    })
+
 @app.route('/extract_frames', methods=['POST'])
 def extract_frames_endpoint():
-    """Extract frames from a video segment"""
+    """Extract frames from one video segment (start_time, duration) or a list of segments.
+
+    Segments are sorted and overlapping ones merged, then all of them are
+    decoded in a single forward pass. Each frame is tagged with the index of
+    its merged segment, and the response lists the merged segments. Frames
+    are sampled by target_fps (default 30), every_nth and max_frames, the
+    last applying per segment.
+    """
     data = request.json
     video_id = data.get('video_id')
-    start_time = data.get('start_time', 0)
-    duration = data.get('duration', 30)
+    try:
+        segments = merge_segments(parse_segments(data))
+        sampling = sampling_options(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    if sampling['target_fps'] is None and sampling['every_nth'] is None:
+        sampling['target_fps'] = 30
     
-    if not video_id or 'videos' not in session or video_id not in session['videos']:
+    video_info = get_session_video(video_id)
+    if not video_info:
         return jsonify({'success': False, 'error': 'Video not found'})
     
-    video_info = session['videos'][video_id]
     video_path = video_info['path']
+    if not os.path.exists(video_path):
+        return jsonify({'success': False, 'error': 'Video file not found'})
+    roi = video_info.get('roi')
+    # The ROI is part of frame URLs so cached images of another crop are not reused
+    url_query = f'?roi={roi_digest(roi)}' if roi else ''
     
-    frames = extract_frames(video_path, start_time, duration)
+    timestamps = load_timestamp_index(video_path)
+    frame_segments = segments_frame_nums(timestamps, segments, **sampling) if timestamps is not None else {}
+    if not frame_segments:
+        return jsonify({'success': False, 'error': 'Failed to extract frames'})
     
-    if frames:
+    if data.get('lazy'):
+        # Only the frame plan is returned; the viewer fetches images from /frame
+        # in a window around its position, prefetching via /prefetch_frames
         return jsonify({
             'success': True,
-            'frames': frames
+            'segments': segments,
+            'frames': [
+                {'frame_num': n, 'time': float(timestamps[n]), 'segment': index,
+                 'url': f'/frame/{video_id}/{n}{url_query}'}
+                for n, index in frame_segments.items()
+            ]
+        })
+    
+    # Preview frames come from the proxy when it is ready; save_frames re-reads
+    # frames tagged 'proxy' from the original
+    proxy_path = get_proxy_path(video_info)
+    metrics.cache_result('proxy', proxy_path is not None)
+    
+    frame_buffer = FrameBuffer(extract_memory, EXTRACT_REQUEST_MEMORY, EXTRACT_SPILL_LIMIT, EXTRACT_WAIT_SECONDS)
+    store_key = frame_store_key(video_info)
+    if FRAME_STORE_COLD:
+        frame_store.remove(store_key)
+    segment = frame_store.segment(store_key)
+    try:
+        with metrics.timed('extract'):
+            # Only decoding into the store needs the segment lock; waiting on
+            # the memory budget happens after it is released, reading the
+            # frames back through zero-copy views of the store
+            with segment.lock:
+                segment.refresh()
+                stored = [
+                    (frame_num, from_proxy) for frame_num, _, from_proxy in iter_encoded_frames(
+                        video_path, timestamps, list(frame_segments), proxy_path, segment, roi
+                    )
+                ]
+                encoded = [(frame_num, segment.get(frame_num), from_proxy) for frame_num, from_proxy in stored]
+            frames = frame_responses(timestamps, encoded, frame_buffer)
+    except BudgetExceeded as e:
+        frame_buffer.release()
+        return jsonify({'success': False, 'error': f'{e}; choose a shorter segment'})
+    except Exception:
+        frame_buffer.release()
+        raise
+    frame_store.evict(keep=store_key)
+    
+    for frame in frames:
+        frame['segment'] = frame_segments[frame['frame_num']]
+        if frame.get('spilled'):
+            frame['url'] = f'/frame/{video_id}/{frame["frame_num"]}{url_query}'
+    
+    usage = frame_buffer.usage()
+    metrics.EXTRACT_MEMORY_BYTES.inc(usage['memory_bytes'])
+    metrics.SPILLED_BYTES.inc(usage['spilled_bytes'])
+    logger.info('Extracted frames', extra={'video_id': video_id, 'segments': len(segments), 'frames': len(frames), **usage})
+    
+    if frames:
+        response = jsonify({
+            'success': True,
+            'segments': segments,
+            'frames': frames,
+            'memory': usage
         })
     else:
+        response = jsonify({'success': False, 'error': 'Failed to extract frames'})
+    
+    # The frames stay in memory until the response body has been sent
+    def release():
+        frame_buffer.release()
+        metrics.EXTRACT_MEMORY_BYTES.dec(usage['memory_bytes'])
+    response.call_on_close(release)
+    return response
+
+@app.route('/frame/<video_id>/<int:frame_num>')
+def serve_frame(video_id, frame_num):
+    """Serve a preview frame from the frame store as JPEG"""
+    video_info = get_session_video(video_id)
+    if not video_info or not os.path.exists(video_info['path']):
+        return 'Video not found', 404
+    
+    # Frames the viewer didn't prefetch are decoded on demand
+    segment, _ = store_frames(video_info, [frame_num])
+    if segment is None:
+        return 'Video not found', 404
+    with segment.lock:
+        if not segment.has(frame_num):
+            return 'Frame not found', 404
+        jpeg = bytes(segment.get(frame_num))
+    
+    response = Response(jpeg, mimetype='image/jpeg')
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response
+
+@app.route('/prefetch_frames', methods=['POST'])
+def prefetch_frames():
+    """Decode frames into the frame store ahead of the viewer requesting them"""
+    data = request.json
+    video_id = data.get('video_id')
+    frame_nums = data.get('frame_nums', [])
+    if not isinstance(frame_nums, list) or \
+            not all(isinstance(n, int) and not isinstance(n, bool) for n in frame_nums):
+        return jsonify({'success': False, 'error': 'frame_nums must be a list of frame numbers'})
+    frame_nums = sorted(set(frame_nums))
+    if len(frame_nums) > PREFETCH_MAX_FRAMES:
+        return jsonify({'success': False, 'error': f'At most {PREFETCH_MAX_FRAMES} frames per request'})
+    
+    video_info = get_session_video(video_id)
+    if not video_info or not os.path.exists(video_info['path']):
+        return jsonify({'success': False, 'error': 'Video not found'})
+    
+    timestamps = load_timestamp_index(video_info['path'])
+    if timestamps is None:
+        return jsonify({'success': False, 'error': 'Failed to extract frames'})
+    if frame_nums and (frame_nums[0] < 0 or frame_nums[-1] >= len(timestamps)):
+        return jsonify({'success': False, 'error': f'frame_nums must be between 0 and {len(timestamps) - 1}'})
+    
+    with metrics.timed('prefetch'):
+        segment, decoded = store_frames(video_info, frame_nums)
+    if segment is None:
         return jsonify({'success': False, 'error': 'Failed to extract frames'})
+    return jsonify({'success': True, 'decoded': decoded})
 
 @app.route('/get_timeline_thumbnails', methods=['POST'])
 def get_timeline_thumbnails_endpoint():
@@ -2270,19 +3768,287 @@ def get_timeline_thumbnails_endpoint():
     data = request.json
     video_id = data.get('video_id')
 
-    if not video_id or 'videos' not in session or video_id not in session['videos']:
+    video_info = get_session_video(video_id)
+    if not video_info:
         return jsonify({'success': False, 'error': 'Video not found'})
 
-    video_info = session['videos'][video_id]
-    video_path = video_info['path']
+    video_path = get_proxy_path(video_info) or video_info['path']
 
-    thumbnails = extract_timeline_thumbnails(video_path)
+    with metrics.timed('thumbnails'):
+        thumbnails = extract_timeline_thumbnails(video_path)
 
     if thumbnails is not None:
         return jsonify({'success': True, 'thumbnails': thumbnails})
     else:
         return jsonify({'success': False, 'error': 'Failed to extract timeline thumbnails'})
 
+def create_output_dir(video_name):
+    """Create a timestamped output directory for a video's saved frames"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = os.path.join(OUTPUT_FOLDER, f'{video_name}_{timestamp}')
+    os.makedirs(output_dir, exist_ok=True)
+    return output_dir
+
+def encode_params(image_format):
+    """OpenCV imencode parameters for a saved frame format"""
+    if image_format == 'png':
+        return [cv2.IMWRITE_PNG_COMPRESSION, SAVE_PNG_COMPRESSION]
+    if image_format == 'jpg':
+        return [cv2.IMWRITE_JPEG_QUALITY, SAVE_JPEG_QUALITY]
+    if image_format == 'webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, SAVE_WEBP_QUALITY]
+    raise ValueError(f'Unsupported image format: {image_format}')
+
+def upload_policy(roboflow_config):
+    """The resize/re-encode policy in a Roboflow config, or None to upload frames as-is.
+
+    Raises ValueError for an invalid policy.
+    """
+    image_format = roboflow_config.get('uploadFormat') or 'jpg'
+    if image_format not in UPLOAD_FORMATS:
+        raise ValueError(f'Unsupported upload format: {image_format}')
+    try:
+        max_size = int(roboflow_config.get('uploadMaxSize') or 0)
+        quality = int(roboflow_config.get('uploadQuality') or 0)
+    except (TypeError, ValueError):
+        raise ValueError('Upload size and quality must be whole numbers')
+    if max_size < 0 or not 0 <= quality <= 100:
+        raise ValueError('Upload size must be positive and quality between 1 and 100')
+    if not max_size and not quality and image_format == 'jpg':
+        return None
+    return {'max_size': max_size, 'quality': quality or UPLOAD_QUALITY, 'format': image_format}
+
+def dedupe_distance(roboflow_config):
+    """Max bit distance at which a frame counts as a near-duplicate; raises ValueError if invalid"""
+    value = roboflow_config.get('dedupeDistance')
+    if value is None or value == '':
+        return DEDUPE_DISTANCE
+    try:
+        distance = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Duplicate distance must be a whole number')
+    if not 0 <= distance <= 64:
+        raise ValueError('Duplicate distance must be between 0 and 64 bits')
+    return distance
+
+def encode_for_upload(image, policy):
+    """Downscale an image to the policy's max size and encode it; returns base64"""
+    height, width = image.shape[:2]
+    if policy['max_size'] and max(height, width) > policy['max_size']:
+        scale = policy['max_size'] / max(height, width)
+        with metrics.timed('upload_resize'):
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+    
+    if policy['format'] == 'jpg':
+        params = [cv2.IMWRITE_JPEG_QUALITY, policy['quality']]
+    elif policy['format'] == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, policy['quality']]
+    else:
+        params = [cv2.IMWRITE_PNG_COMPRESSION, SAVE_PNG_COMPRESSION]
+    with metrics.timed('upload_encode'):
+        ok, buffer = cv2.imencode(f'.{policy["format"]}', image, params)
+    if not ok:
+        raise ValueError(f'Could not encode frame as {policy["format"]}')
+    return base64.b64encode(buffer).decode('utf-8')
+
+def write_frames(frames, output_dir, video_name, roboflow_config=None, start_index=0, image_format=None, workers=None, stats=None,
+                 export=None):
+    """Write frames as image files and optionally upload each one to Roboflow.
+
+    frames is any iterable of dicts with a BGR 'image' and its 'time', so a
+    generator can decode them while earlier frames are still being written.
+    Frames are numbered by their 'index' in the caller's list if given (so
+    frames the generator skips leave gaps), else by position, offset by
+    start_index so long jobs can write in chunks. A base64 JPEG in 'data' is
+    uploaded as-is; otherwise the image is encoded for upload.
+    roboflow_config uses the page's keys (apiKey, url, batchName, split,
+    dedupe 'skip' or 'flag' with dedupeDistance, and the upload policy read
+    by upload_policy). Files are encoded in image_format (default
+    SAVE_FORMAT) on up to workers threads (default SAVE_WORKERS), then
+    written to disk while the uploads run alongside. With export (a
+    DatasetWriter) the files go into its dataset layout instead of
+    output_dir; the caller closes it. If stats is a dict it is filled with
+    each stage's utilization. Returns the per-frame Roboflow results.
+    """
+    image_format = image_format or SAVE_FORMAT
+    params = encode_params(image_format)
+    upload = bool(roboflow_config and roboflow_config.get('apiKey') and roboflow_config.get('url'))
+    dedupe = upload and roboflow_config.get('dedupe') in ('skip', 'flag')
+    if upload:
+        batch_name = roboflow_config.get('batchName') if roboflow_config.get('batchName') else video_name
+        split = roboflow_config.get('split', 'train')
+        policy = upload_policy(roboflow_config)
+        upload_extension = policy['format'] if policy else 'jpg'
+        project = roboflow_project(roboflow_config['apiKey'], roboflow_config['url'])
+    if dedupe:
+        hash_index = hash_indexes.index(project.name)
+        max_distance = dedupe_distance(roboflow_config)
+        batch_hashes = []
+        uploaded_hashes = []
+    
+    def encode(item):
+        i, frame_data = item
+        name = f'frame_{i+1:03d}_time_{frame_data["time"]:.1f}s'
+        with metrics.timed('image_encode'):
+            ok, buffer = cv2.imencode(f'.{image_format}', frame_data['image'], params)
+        if not ok:
+            raise ValueError(f'Could not encode {name}.{image_format}')
+        
+        height, width = frame_data['image'].shape[:2]
+        encoded = {
+            'index': i,
+            'name': name,
+            'buffer': buffer,
+            'info': {'time': frame_data['time'], 'frame_num': frame_data.get('frame_num'), 'width': width, 'height': height}
+        }
+        if upload:
+            if policy:
+                image_data = encode_for_upload(frame_data['image'], policy)
+            else:
+                image_data = frame_data.get('data')
+                if not image_data:
+                    _, jpeg = cv2.imencode('.jpg', frame_data['image'])
+                    image_data = base64.b64encode(jpeg).decode('utf-8')
+            encoded['image_data'] = image_data
+        if dedupe:
+            with metrics.timed('phash'):
+                encoded['phash'] = phash(frame_data['image'])
+        return encoded
+    
+    def write(item):
+        if export is not None:
+            export.add(video_name, item['name'], item['buffer'].tobytes(), item['info'])
+        else:
+            with metrics.timed('image_write'):
+                write_file(os.path.join(output_dir, f'{item["name"]}.{image_format}'), item['buffer'])
+    
+    def find_duplicate(item):
+        # One worker, so frames earlier in the batch are always seen first
+        distance = hash_index.nearest(item['phash'])
+        if batch_hashes:
+            batch_distance = int(hamming_distances(np.array(batch_hashes, dtype=np.uint64), item['phash']).min())
+            distance = batch_distance if distance is None else min(distance, batch_distance)
+        if distance is not None and distance <= max_distance:
+            item['duplicate_distance'] = distance
+        if 'duplicate_distance' not in item or roboflow_config['dedupe'] == 'flag':
+            batch_hashes.append(item['phash'])
+        return item
+    
+    def upload_frame(item):
+        duplicate = 'duplicate_distance' in item
+        if duplicate and roboflow_config['dedupe'] == 'skip':
+            return {
+                'frame': item['index'],
+                'success': True,
+                'skipped': True,
+                'duplicate_distance': item['duplicate_distance'],
+                'message': f'Skipped near-duplicate ({item["duplicate_distance"]} bits from an uploaded frame)'
+            }
+        success, message = project.upload(
+            item['image_data'],
+            f'{item["name"]}.{upload_extension}',
+            split=split,
+            batch_name=batch_name
+        )
+        result = {'frame': item['index'], 'success': success, 'message': message}
+        if duplicate:
+            result['duplicate_distance'] = item['duplicate_distance']
+        if success and dedupe:
+            uploaded_hashes.append(item['phash'])
+        return result
+    
+    # A profiled request's Server-Timing and cProfile cover the pipeline threads too
+    numbered = (
+        (start_index + frame_data.get('index', position), frame_data) for position, frame_data in enumerate(frames)
+    )
+    pipeline = Pipeline(numbered, source_name='decode', queue_size=SAVE_QUEUE_SIZE,
+                        thread_context=profiling.worker_context())
+    pipeline.add(Stage('encode', encode, workers or SAVE_WORKERS), after='decode')
+    pipeline.add(Stage('write', write), after='encode')
+    if dedupe:
+        pipeline.add(Stage('dedupe', find_duplicate), after='encode')
+        pipeline.add(Stage('upload', upload_frame, UPLOAD_WORKERS), after='dedupe')
+    elif upload:
+        pipeline.add(Stage('upload', upload_frame, UPLOAD_WORKERS), after='encode')
+    try:
+        report = pipeline.run()
+    finally:
+        if dedupe:
+            hash_index.add(uploaded_hashes)
+    
+    for stage, stage_stats in report['stages'].items():
+        metrics.SAVE_STAGE_UTILIZATION.labels(stage).observe(stage_stats['utilization'])
+    bottleneck = max(report['stages'], key=lambda stage: report['stages'][stage]['utilization'])
+    logger.info('Saved frames', extra={
+        'output_dir': output_dir,
+        'frames': report['stages']['decode']['items'],
+        'wall_seconds': report['wall_seconds'],
+        'bottleneck': bottleneck,
+        'utilization': {stage: stage_stats['utilization'] for stage, stage_stats in report['stages'].items()}
+    })
+    if stats is not None:
+        stats.update(report, bottleneck=bottleneck)
+    
+    return sorted(pipeline.results('upload'), key=lambda result: result['frame']) if upload else []
+
+def iter_save_frames(video_info, frames_data):
+    """Yield the page's selected frames as images for write_frames.
+
+    Frames previewed from the proxy, or loaded by URL without inline data,
+    are re-read at full quality from the original and cropped to the video's
+    ROI; the rest are decoded from their JPEG, which the preview already
+    cropped. Frames are decoded one at a time as the pipeline asks for them,
+    each tagged with its 'index' in frames_data. Inline frames come first,
+    then re-read ones in frame order, so at most one re-read image is held
+    whatever order the page sent. Frames that cannot be read are skipped.
+    """
+    def needs_reread(frame_data):
+        return frame_data.get('source') == 'proxy' or not frame_data.get('data')
+    
+    def decoded(index, frame_data):
+        with metrics.timed('jpeg_decode'):
+            frame_bytes = base64.b64decode(frame_data['data'])
+            frame_array = np.frombuffer(frame_bytes, dtype=np.uint8)
+            frame = cv2.imdecode(frame_array, cv2.IMREAD_COLOR)
+        return {'image': frame, 'time': frame_data['time'], 'frame_num': frame_data.get('frame_num'),
+                'data': frame_data['data'], 'index': index}
+    
+    reread = sorted(
+        (frame_data['frame_num'], index) for index, frame_data in enumerate(frames_data)
+        if needs_reread(frame_data) and isinstance(frame_data.get('frame_num'), int)
+        and not isinstance(frame_data['frame_num'], bool) and frame_data['frame_num'] >= 0
+    )
+    queued = {index for _, index in reread}
+    for index, frame_data in enumerate(frames_data):
+        if index in queued:
+            continue
+        if not frame_data.get('data'):
+            logger.warning('Could not re-read frame for saving', extra={'frame_num': frame_data.get('frame_num')})
+            continue
+        yield decoded(index, frame_data)
+    
+    originals = iter(())
+    if reread:
+        timestamps = load_timestamp_index(video_info['path'])
+        if timestamps is not None:
+            originals = read_frames(video_info['path'], [frame_num for frame_num, _ in reread], timestamps,
+                                    video_info.get('roi'))
+    
+    # read_frames yields in frame order too, skipping frames it cannot decode;
+    # the current original is kept for repeats of the same frame
+    original = next(originals, None)
+    for frame_num, index in reread:
+        while original is not None and original[0] < frame_num:
+            original = next(originals, None)
+        frame_data = frames_data[index]
+        if original is not None and original[0] == frame_num:
+            yield {'image': original[1], 'time': frame_data['time'], 'frame_num': frame_num, 'index': index}
+        elif frame_data.get('data'):
+            yield decoded(index, frame_data)
+        else:
+            logger.warning('Could not re-read frame for saving', extra={'frame_num': frame_num})
+
 @app.route('/save_frames', methods=['POST'])
 def save_frames():
     """Save selected frames to disk and optionally upload to Roboflow"""
@@ -2292,69 +4058,133 @@ def save_frames():
     frames_data = data.get('frames', [])
     upload_to_roboflow = data.get('upload_to_roboflow', False)
     roboflow_config = data.get('roboflow_config', {})
+    image_format = data.get('image_format', SAVE_FORMAT)
+    if image_format not in SAVE_FORMATS:
+        return jsonify({'success': False, 'error': f'Unsupported image format: {image_format}'})
+    if upload_to_roboflow and roboflow_config and roboflow_config.get('apiKey') and roboflow_config.get('url'):
+        # Fail before any frames are decoded or written if the config is unusable
+        try:
+            upload_policy(roboflow_config)
+            dedupe_distance(roboflow_config)
+            project = roboflow_project(roboflow_config['apiKey'], roboflow_config['url'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)})
+        success, message = project.validate()
+        if not success:
+            return jsonify({'success': False, 'error': f'Roboflow: {message}'})
+    export_options = data.get('export')
+    if export_options:
+        if not isinstance(export_options, dict):
+            return jsonify({'success': False, 'error': 'Export options must be an object'})
+        if export_options.get('format') not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'error': f'Unsupported export format: {export_options.get("format")}'})
+        try:
+            parse_splits(export_options.get('splits'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)})
+        try:
+            shard_frames = int(export_options.get('shard_frames') or EXPORT_SHARD_FRAMES)
+        except (TypeError, ValueError):
+            shard_frames = 0
+        if shard_frames < 1:
+            return jsonify({'success': False, 'error': 'Shard size must be a positive whole number of frames'})
     
-    if not video_id or 'videos' not in session or video_id not in session['videos']:
+    video_info = get_session_video(video_id)
+    if not video_info:
         return jsonify({'success': False, 'error': 'Video not found'})
     
-    video_info = session['videos'][video_id]
     video_name_raw = os.path.splitext(video_info['name'])[0]
+    output_dir = create_output_dir(video_name_raw)
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_dir = os.path.join(OUTPUT_FOLDER, f'{video_name_raw}_{timestamp}')
-    os.makedirs(output_dir, exist_ok=True)
-    
-    roboflow_results = []
+    export = None
+    if export_options:
+        try:
+            export = DatasetWriter(
+                output_dir,
+                export_options['format'],
+                splits=export_options.get('splits'),
+                image_format=image_format,
+                shard_frames=shard_frames,
+                shard_bytes=EXPORT_SHARD_BYTES
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)})
     
-    for i, frame_data in enumerate(frames_data):
-        frame_bytes = base64.b64decode(frame_data['data'])
-        frame_array = np.frombuffer(frame_bytes, dtype=np.uint8)
-        frame = cv2.imdecode(frame_array, cv2.IMREAD_COLOR);
-        
-        filename = f'frame_{i+1:03d}_time_{frame_data["time"]:.1f}s.png'
-        filepath = os.path.join(output_dir, filename)
-        cv2.imwrite(filepath, frame)
-        
-        if upload_to_roboflow and roboflow_config.get('apiKey') and roboflow_config.get('url'):
-            image_name = f'frame_{i+1:03d}_time_{frame_data["time"]:.1f}s.jpg'
-            
-            batch_name = roboflow_config.get('batchName') if roboflow_config.get('batchName') else video_name_raw
-            split = roboflow_config.get('split', 'train')
-
-            success, message = upload_to_roboflow_api(
-                roboflow_config['apiKey'],
-                roboflow_config['url'],
-                frame_data['data'],
-                image_name,
-                split=split,
-                batch_name=batch_name
+    pipeline_stats = {}
+    try:
+        with metrics.timed('write'):
+            roboflow_results = write_frames(
+                iter_save_frames(video_info, frames_data),
+                output_dir,
+                video_name_raw,
+                roboflow_config if upload_to_roboflow else None,
+                image_format=image_format,
+                stats=pipeline_stats,
+                export=export
             )
-            roboflow_results.append({
-                'frame': i,
-                'success': success,
-                'message': message
-            })
+    finally:
+        export_summary = export.close() if export is not None else None
     
+    written = pipeline_stats['stages']['decode']['items']
     response_data = {
         'success': True,
         'output_dir': output_dir,
-        'frame_count': len(frames_data)
+        'frame_count': written,
+        'pipeline': pipeline_stats
     }
+    if written < len(frames_data):
+        response_data['skipped_frames'] = len(frames_data) - written
+    if export_summary:
+        response_data['export'] = export_summary
     
     if roboflow_results:
         response_data['roboflow_results'] = roboflow_results
     
     return jsonify(response_data)
 
+def remove_video_files(video_info):
+    """Delete the temporary files owned by a video entry"""
+    if os.path.exists(video_info['path']):
+        frame_store.remove(frame_store_key(video_info))
+    if video_info['type'] == 'youtube' and os.path.exists(video_info['path']):
+        os.remove(video_info['path'])
+    proxy_path = get_proxy_path(video_info)
+    if proxy_path:
+        os.remove(proxy_path)
+        proxy_fps_cache.pop(proxy_path, None)
+
+@app.route('/queue', methods=['GET'])
+def get_queue():
+    """List the videos queued in this session"""
+    videos = session_store.get_videos(get_session_id())
+    return jsonify({
+        'success': True,
+        'videos': [
+            {'id': video_id, 'name': info['name'], 'type': info['type']}
+            for video_id, info in videos.items()
+        ]
+    })
+
+@app.route('/remove_video', methods=['POST'])
+def remove_video():
+    """Remove a video from this session's queue"""
+    data = request.json
+    video_info = session_store.remove_video(get_session_id(), data.get('video_id'))
+    if not video_info:
+        return jsonify({'success': False, 'error': 'Video not found'})
+    
+    remove_video_files(video_info)
+    return jsonify({'success': True})
+
 @app.route('/cleanup', methods=['POST'])
 def cleanup():
     """Clean up temporary files"""
-    if 'videos' in session:
-        for video_id, video_info in session['videos'].items():
-            if video_info['type'] == 'youtube' and os.path.exists(video_info['path']):
-                os.remove(video_info['path'])
-        session.pop('videos', None)
+    if 'sid' in session:
+        for video_info in session_store.clear_session(session['sid']).values():
+            remove_video_files(video_info)
     
     return jsonify({'success': True})
 
 if __name__ == '__main__':
+    # Development server only; see wsgi.py and gunicorn.conf.py for production
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,300 @@
+"""Reproducible benchmarks for the extraction, save and upload pipeline.
+
+Synthesizes fixture videos, times each pipeline stage and the HTTP endpoints
+(through Flask's test client, uploading to a local Roboflow stub) and writes
+JSON results that can be compared across commits:
+
+    python benchmarks/bench.py --output before.json
+    # ... change something ...
+    python benchmarks/bench.py --output after.json --baseline before.json
+
+With --baseline, any benchmark whose median time grew by more than its
+threshold is reported and the exit code is 1.
+"""
+import argparse
+import base64
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+FIXTURE_DIR = os.path.join(BENCH_DIR, 'fixtures')
+sys.path.insert(0, REPO_ROOT)
+
+import cv2
+import numpy as np
+
+import roboflow_stub
+from fixtures import make_video
+
+# name: make_video arguments. 'quick' fixtures run by default; --full adds the rest.
+FIXTURES = {
+    '720p30_mp4v': dict(width=1280, height=720, fps=30, duration=10, codec='mp4v', quick=True),
+    '720p30_mjpg_intra': dict(width=1280, height=720, fps=30, duration=10, codec='MJPG', quick=True),
+    '1080p30_mp4v_gop250': dict(width=1920, height=1080, fps=30, duration=10, codec='mp4v', gop=250),
+    '1080p60_mp4v_gop12': dict(width=1920, height=1080, fps=60, duration=10, codec='mp4v', gop=12),
+    '480p24_xvid_long': dict(width=854, height=480, fps=24, duration=60, codec='XVID'),
+}
+
+SEGMENT = 2          # seconds of video per extraction
+SAVE_FRAMES = 30     # frames written per save benchmark
+UPLOAD_FRAMES = 10   # frames uploaded to the stub per upload benchmark
+
+# Allowed fractional slowdown of the median before a benchmark counts as a
+# regression. Network-bound benchmarks are noisier than pure CPU work.
+DEFAULT_THRESHOLD = 0.15
+THRESHOLDS = {
+    'upload': 0.30,
+    'http_save_frames': 0.30,
+    # A few milliseconds of frame store reads and base64, so relatively noisy
+    'http_extract_frames_warm': 0.30,
+}
+# Differences below this many seconds are treated as noise
+MIN_DELTA = 0.002
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list, e.g. fraction=0.95 for p95"""
+    return values[max(0, math.ceil(len(values) * fraction) - 1)]
+
+
+def measure(fn, repeat, warmup=1, setup=None):
+    """Run fn warmup + repeat times; fn returns the number of items processed.
+
+    setup, if given, runs untimed before every run, e.g. to empty a cache.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    times = []
+    items = 0
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        items = fn()
+        times.append(time.perf_counter() - started)
+    median = statistics.median(times)
+    return {
+        'median_s': median,
+        'p95_s': percentile(sorted(times), 0.95),
+        'min_s': min(times),
+        'max_s': max(times),
+        'repeat': repeat,
+        'items': items,
+        'items_per_s': items / median if median > 0 and items else None
+    }
+
+
+def stage_benchmarks(app, video_path, work_dir):
+    """Benchmarks that call the pipeline functions directly"""
+    metadata = app.probe_video(video_path)
+    start = max(0, metadata['duration'] / 2 - SEGMENT / 2)
+    proxy_path = os.path.join(work_dir, 'proxy.avi')
+    output_dir = os.path.join(work_dir, 'stage_output')
+    os.makedirs(output_dir, exist_ok=True)
+
+    images = [image for _, _, image in app.iter_frames(video_path, 0, SAVE_FRAMES / metadata['fps'] + 1)][:SAVE_FRAMES]
+    encoded = [base64.b64encode(cv2.imencode('.jpg', image)[1]).decode() for image in images[:UPLOAD_FRAMES]]
+
+    def probe():
+        app.probe_video(video_path)
+        return 1
+
+    def timestamp_index():
+        app.timestamp_cache.clear()
+        index_path = app.timestamp_index_path(video_path)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        return len(app.load_timestamp_index(video_path))
+
+    def proxy_transcode():
+        app.transcode_proxy(video_path, proxy_path)
+        return metadata['frame_count']
+
+    def write_png():
+        app.write_frames([{'image': image, 'time': 0.0} for image in images], output_dir, 'bench')
+        return len(images)
+
+    def upload():
+        for i, data in enumerate(encoded):
+            success, message = app.upload_to_roboflow_api('bench-key', 'https://app.roboflow.com/bench/project', data, f'bench_{i}.jpg')
+            if not success:
+                raise RuntimeError(message)
+        return len(encoded)
+
+    return {
+        'probe': probe,
+        'timestamp_index': timestamp_index,
+        'decode': lambda: sum(1 for _ in app.iter_frames(video_path, start, SEGMENT)),
+        'extract_frames': lambda: len(app.extract_frames(video_path, start, SEGMENT)),
+        'thumbnails': lambda: len(app.extract_timeline_thumbnails(video_path)),
+        'proxy_transcode': proxy_transcode,
+        'extract_frames_proxy': lambda: len(app.extract_frames(video_path, start, SEGMENT, proxy_path=proxy_path)),
+        'write_png': write_png,
+        'upload': upload,
+    }
+
+
+def http_benchmarks(app, video_path):
+    """Benchmarks that go through the Flask routes with a test client.
+
+    /extract_frames is measured twice: cold, with the frame store emptied
+    before each run so every frame is decoded, and warm, served from it.
+    """
+    client = app.app.test_client()
+    with open(video_path, 'rb') as f:
+        response = client.post('/upload_file', data={'file': (f, os.path.basename(video_path))})
+    video = response.get_json()['video']
+    info = client.post('/get_video_info', json={'video_id': video['id']}).get_json()
+    start = max(0, info['duration'] / 2 - SEGMENT / 2)
+
+    frames = client.post('/extract_frames', json={'video_id': video['id'], 'start_time': start, 'duration': SEGMENT}).get_json()['frames']
+    save_request = {
+        'video_id': video['id'],
+        'frames': frames[:UPLOAD_FRAMES],
+        'upload_to_roboflow': True,
+        'roboflow_config': {'apiKey': 'bench-key', 'url': 'https://app.roboflow.com/bench/project', 'split': 'train'}
+    }
+
+    def clear_frame_store():
+        for key in os.listdir(app.frame_store.root):
+            app.frame_store.remove(key)
+
+    def post(route, payload, count):
+        def run():
+            response = client.post(route, json=payload)
+            data = response.get_json()
+            # Closing returns /extract_frames' memory budget, as sending the body would
+            response.close()
+            if not data.get('success'):
+                raise RuntimeError(f'{route}: {data.get("error")}')
+            return count(data)
+        return run
+
+    extract = post('/extract_frames', {'video_id': video['id'], 'start_time': start, 'duration': SEGMENT},
+                   lambda data: len(data['frames']))
+    return {
+        'http_get_video_info': post('/get_video_info', {'video_id': video['id']}, lambda data: 1),
+        'http_extract_frames_cold': (clear_frame_store, extract),
+        'http_extract_frames_warm': extract,
+        'http_timeline_thumbnails': post('/get_timeline_thumbnails', {'video_id': video['id']},
+                                         lambda data: len(data['thumbnails'])),
+        'http_save_frames': post('/save_frames', save_request, lambda data: data['frame_count']),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def compare(results, baseline):
+    """Return (name, old, new, change, threshold) for benchmarks that regressed"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        stage = name.split('/', 1)[1]
+        threshold = THRESHOLDS.get(stage, DEFAULT_THRESHOLD)
+        delta = result['median_s'] - old['median_s']
+        change = delta / old['median_s'] if old['median_s'] else 0
+        if change > threshold and delta > MIN_DELTA:
+            regressions.append((name, old['median_s'], result['median_s'], change, threshold))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--baseline', help='Compare against a previous JSON result file')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (default: 5)')
+    parser.add_argument('--full', action='store_true', help='Include the large and long fixtures')
+    parser.add_argument('--fixture', action='append', choices=sorted(FIXTURES), help='Only run these fixtures')
+    parser.add_argument('--only', action='append', help='Only run benchmarks whose name contains this string')
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    names = args.fixture or [name for name, spec in FIXTURES.items() if args.full or spec.get('quick')]
+
+    # The app creates its folders and session database relative to the working directory
+    work_dir = tempfile.mkdtemp(prefix='videoapp_bench_')
+    os.chdir(work_dir)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    stub, stub_url = roboflow_stub.start()
+    import app
+    app.ROBOFLOW_API_URL = stub_url
+    app.PROXY_ENABLED = False  # proxies are benchmarked explicitly, not in the background
+
+    results = {}
+    try:
+        for name in names:
+            spec = {k: v for k, v in FIXTURES[name].items() if k != 'quick'}
+            extension = 'avi' if spec['codec'] in ('MJPG', 'XVID') else 'mp4'
+            video_path = make_video(os.path.join(FIXTURE_DIR, f'bench_{name}.{extension}'), **spec)
+
+            fixture_dir = os.path.join(work_dir, name)
+            os.makedirs(fixture_dir, exist_ok=True)
+            benchmarks = stage_benchmarks(app, video_path, fixture_dir)
+            benchmarks.update(http_benchmarks(app, video_path))
+
+            for stage, fn in benchmarks.items():
+                key = f'{name}/{stage}'
+                if args.only and not any(part in key for part in args.only):
+                    continue
+                # A (setup, fn) pair runs setup untimed before each run
+                setup, fn = fn if isinstance(fn, tuple) else (None, fn)
+                results[key] = measure(fn, args.repeat, setup=setup)
+                result = results[key]
+                rate = f'{result["items_per_s"]:9.1f}/s' if result['items_per_s'] else ''
+                print(f'{key:<45} {result["median_s"] * 1000:9.1f} ms {rate}', file=sys.stderr)
+    finally:
+        stub.shutdown()
+        app.shutdown_background_jobs()
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {'environment': environment(), 'fixtures': {name: FIXTURES[name] for name in names}, 'results': results}
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'])
+        print(f'Compared with {args.baseline} (commit {baseline["environment"].get("commit")}): '
+              f'{len(regressions)} regression(s)', file=sys.stderr)
+        for name, old, new, change, threshold in regressions:
+            print(f'  {name}: {old * 1000:.1f} ms -> {new * 1000:.1f} ms (+{change:.0%}, threshold {threshold:.0%})',
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Synthetic fixture videos for benchmarks and load tests."""
+import os
+
+import cv2
+import numpy as np
+
+
+def make_video(path, width=1280, height=720, fps=30, duration=10, codec='mp4v', gop=None):
+    """Write a synthetic video with moving content so encoders can't cheat.
+
+    gop sets the keyframe interval where the FFmpeg backend honours it; use
+    codec='MJPG' for an all-intra file. Returns the path, reusing an existing
+    file with the same name.
+    """
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    params = [cv2.VIDEOWRITER_PROP_KEY_INTERVAL, gop] if gop else []
+    writer = cv2.VideoWriter(path, cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*codec), fps, (width, height), params)
+    if not writer.isOpened():
+        raise RuntimeError(f'Cannot write {path} with codec {codec}')
+
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 40, (height, width, 3), dtype=np.uint8)
+    y, x = np.mgrid[0:height, 0:width]
+    for i in range(int(fps * duration)):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (x + i * 4) % 256
+        frame[..., 1] = (y + i * 2) % 256
+        frame[..., 2] = ((x + y) // 4 + i) % 256
+        frame = cv2.add(frame, np.roll(noise, i * 7, axis=1))
+        cv2.putText(frame, f'{i}', (40, height // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                    height / 200, (255, 255, 255), max(2, height // 150))
+        writer.write(frame)
+
+    writer.release()
+    return path
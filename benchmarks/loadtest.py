@@ -0,0 +1,159 @@
+"""Concurrent /extract_frames load test against a running server.
+
+Start the server first (e.g. `gunicorn -c gunicorn.conf.py` or `python wsgi.py`),
+then:
+
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --users 1 4 16
+
+Each simulated user has its own session, uploads a synthetic fixture video,
+then repeatedly loads random segments for the test duration. Revisited
+segments are served from the server's frame store, so a long run measures a
+mostly warm store; start the server with FRAME_STORE_COLD=1 to decode every
+request instead. Each level reports the frame store hit rate it saw, read
+from the server's /metrics.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+
+import requests
+
+from bench import percentile
+from fixtures import make_video
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+STORE_LOOKUPS = re.compile(r'^videoapp_cache_requests_total\{cache="frame_store",result="(hit|miss)"\} (\S+)$', re.M)
+
+
+class User:
+    def __init__(self, base_url, fixture_path, wait_for_proxy):
+        self.base_url = base_url
+        self.http = requests.Session()
+
+        with open(fixture_path, 'rb') as f:
+            response = self.http.post(f'{base_url}/upload_file', files={'file': (os.path.basename(fixture_path), f)})
+        data = response.json()
+        if not data.get('success'):
+            raise RuntimeError(f'Upload failed: {data}')
+        self.video_id = data['video']['id']
+
+        # Wait for the proxy transcode so runs measure steady-state extraction
+        deadline = time.time() + 300
+        while True:
+            info = self.http.post(f'{base_url}/get_video_info', json={'video_id': self.video_id}).json()
+            if not wait_for_proxy or info.get('proxy_status') != 'pending' or time.time() > deadline:
+                break
+            time.sleep(0.5)
+        self.duration = info['duration']
+
+    def extract(self, segment):
+        start = random.uniform(0, max(0, self.duration - segment))
+        started = time.perf_counter()
+        response = self.http.post(f'{self.base_url}/extract_frames', json={
+            'video_id': self.video_id,
+            'start_time': start,
+            'duration': segment
+        })
+        elapsed = time.perf_counter() - started
+        data = response.json()
+        return elapsed, len(data.get('frames', [])) if data.get('success') else None
+
+
+def frame_store_lookups(base_url):
+    """The server's cumulative {'hit': n, 'miss': n} frame store lookups"""
+    lookups = {'hit': 0.0, 'miss': 0.0}
+    for result, value in STORE_LOOKUPS.findall(requests.get(f'{base_url}/metrics').text):
+        lookups[result] = float(value)
+    return lookups
+
+
+def run_level(base_url, users, seconds, segment):
+    """Run all users concurrently for a fixed time; return summary stats"""
+    latencies = []
+    frames = 0
+    errors = 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(users))
+
+    def worker(user):
+        nonlocal frames, errors
+        barrier.wait()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            try:
+                elapsed, count = user.extract(segment)
+            except requests.RequestException:
+                elapsed, count = None, None
+            with lock:
+                if count is None:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+                    frames += count
+
+    lookups_before = frame_store_lookups(base_url)
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    lookups_after = frame_store_lookups(base_url)
+    hits = lookups_after['hit'] - lookups_before['hit']
+    misses = lookups_after['miss'] - lookups_before['miss']
+
+    latencies.sort()
+    return {
+        'users': len(users),
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_sec': len(latencies) / wall,
+        'frames_per_sec': frames / wall,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else None,
+        'p95_ms': percentile(latencies, 0.95) * 1000 if latencies else None,
+        'frame_store_hit_rate': hits / (hits + misses) if hits + misses else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server base URL')
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 16], help='Concurrency levels to test')
+    parser.add_argument('--seconds', type=float, default=30, help='Duration of each level')
+    parser.add_argument('--segment', type=float, default=2, help='Seconds of video per /extract_frames call')
+    parser.add_argument('--resolution', default='1280x720', help='Fixture resolution WIDTHxHEIGHT')
+    parser.add_argument('--no-wait-proxy', action='store_true', help="Don't wait for proxy transcodes")
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.resolution.split('x'))
+    fixture = make_video(os.path.join(FIXTURE_DIR, f'load_{width}x{height}.mp4'), width, height, duration=20)
+
+    print(f'Registering {max(args.users)} users...', file=sys.stderr)
+    users = [User(args.url, fixture, not args.no_wait_proxy) for _ in range(max(args.users))]
+
+    results = []
+    print(f'{"users":>5} {"requests":>9} {"errors":>6} {"req/s":>8} {"frames/s":>9} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"store hits":>10}')
+    for level in args.users:
+        result = run_level(args.url, users[:level], args.seconds, args.segment)
+        results.append(result)
+        print(f'{result["users"]:>5} {result["requests"]:>9} {result["errors"]:>6} '
+              f'{result["requests_per_sec"]:>8.2f} {result["frames_per_sec"]:>9.1f} '
+              f'{result["p50_ms"] or 0:>8.0f} {result["p95_ms"] or 0:>8.0f} '
+              f'{result["frame_store_hit_rate"] or 0:>10.0%}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'url': args.url, 'segment': args.segment, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
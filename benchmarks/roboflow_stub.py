@@ -0,0 +1,208 @@
+"""Local stand-in for the Roboflow API used by benchmarks and load tests.
+
+Serves the two endpoints the app calls:
+
+    GET  /<workspace>/<project>          project info (connection test)
+    POST /dataset/<project>/upload       image upload
+
+Point the app at it with ROBOFLOW_API_URL (or app.ROBOFLOW_API_URL):
+
+    python benchmarks/roboflow_stub.py --port 9001
+    ROBOFLOW_API_URL=http://127.0.0.1:9001 python wsgi.py
+
+Uploads can be made to behave like a busy production API: --latency and
+--jitter add response time, --error-rate fails a fraction with 500, and
+--rate-limit (uploads/s, token bucket of --burst) or --max-concurrent reject
+excess uploads with 429 and a Retry-After header:
+
+    python benchmarks/roboflow_stub.py --latency 0.2 --jitter 0.1 --error-rate 0.05 --rate-limit 20
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, keep-alive
+    # clients wait out a delayed ACK on every response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if not self._authorized(url):
+            return
+        if len(parts) != 2:
+            return self._reply(404, {'error': 'Not found'})
+        workspace, project = parts
+        self._reply(200, {'workspace': {'url': workspace}, 'project': {'id': f'{workspace}/{project}', 'images': self.server.uploads}})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        # Drain the body first so keep-alive connections stay usable
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self._authorized(url):
+            return
+        if len(parts) != 3 or parts[0] != 'dataset' or parts[2] != 'upload':
+            return self._reply(404, {'error': 'Not found'})
+
+        server = self.server
+        with server.lock:
+            server.attempts += 1
+            retry_after = server.throttle()
+            if retry_after is None:
+                server.in_flight += 1
+                server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+            else:
+                server.throttled += 1
+        if retry_after is not None:
+            return self._reply(429, {'error': 'Rate limit exceeded'}, {'Retry-After': str(retry_after)})
+
+        try:
+            delay = server.latency + server.jitter * server.random.random()
+            if delay > 0:
+                time.sleep(delay)
+            if server.random.random() < server.error_rate:
+                with server.lock:
+                    server.errors += 1
+                return self._reply(500, {'error': 'Internal server error'})
+            with server.lock:
+                server.uploads += 1
+                server.upload_bytes += len(body)
+            self._reply(200, {'success': True, 'id': uuid.uuid4().hex})
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _authorized(self, url):
+        if not parse_qs(url.query).get('api_key'):
+            self._reply(401, {'error': 'Missing api_key'})
+            return False
+        return True
+
+    def _reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0, jitter=0, error_rate=0, rate_limit=0, burst=None, max_concurrent=0, seed=None):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst or max(1, rate_limit)
+        self.max_concurrent = max_concurrent
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.refilled = time.monotonic()
+        self.reset()
+
+    def reset(self):
+        """Zero the counters between load test runs"""
+        with self.lock:
+            self.attempts = 0
+            self.uploads = 0
+            self.upload_bytes = 0
+            self.errors = 0
+            self.throttled = 0
+            self.in_flight = 0
+            self.peak_in_flight = 0
+
+    def throttle(self):
+        """Seconds the client should wait if this upload is rejected, else None; call with lock held"""
+        if self.max_concurrent and self.in_flight >= self.max_concurrent:
+            return 1
+        if not self.rate_limit:
+            return None
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate_limit)
+        self.refilled = now
+        if self.tokens < 1:
+            return max(1, math.ceil((1 - self.tokens) / self.rate_limit))
+        self.tokens -= 1
+        return None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'attempts': self.attempts,
+                'uploads': self.uploads,
+                'upload_bytes': self.upload_bytes,
+                'errors': self.errors,
+                'throttled': self.throttled,
+                'peak_in_flight': self.peak_in_flight
+            }
+
+
+def start(host='127.0.0.1', port=0, **options):
+    """Start the stub in a background thread; returns (server, base_url).
+
+    options are StubServer's latency, jitter, error_rate, rate_limit, burst,
+    max_concurrent and seed.
+    """
+    server = StubServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def add_behaviour_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0, help='Seconds added to every upload')
+    parser.add_argument('--jitter', type=float, default=0, help='Up to this many extra random seconds per upload')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of uploads failed with 500')
+    parser.add_argument('--rate-limit', type=float, default=0, help='Uploads/s allowed before 429 (0: unlimited)')
+    parser.add_argument('--burst', type=int, help='Uploads allowed at once above the rate (default: one second\'s worth)')
+    parser.add_argument('--max-concurrent', type=int, default=0, help='Concurrent uploads allowed before 429 (0: unlimited)')
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible latency and errors')
+
+
+def behaviour_options(args):
+    return {
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'error_rate': args.error_rate,
+        'rate_limit': args.rate_limit,
+        'burst': args.burst,
+        'max_concurrent': args.max_concurrent,
+        'seed': args.seed
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9001)
+    add_behaviour_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server, base_url = start(args.host, args.port, **behaviour_options(args))
+    print(f'Roboflow stub listening on {base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Frames/sec written by write_frames at different thread counts and formats.
+
+    python benchmarks/save_throughput.py --frames 100 --resolution 1920x1080 --threads 1 4 8
+
+Frames come from a synthetic fixture video so they compress like real footage.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, 'fixtures')
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fixtures import make_video
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=100, help='Frames written per run')
+    parser.add_argument('--resolution', default='1920x1080', help='Frame size WIDTHxHEIGHT')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, os.cpu_count() or 1], help='Writer thread counts')
+    parser.add_argument('--format', nargs='+', default=['png'], help='Image formats to test')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per configuration; the best is reported')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='videoapp_save_')
+    cwd = os.getcwd()
+    os.chdir(work_dir)  # the app creates its folders relative to the working directory
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app
+
+    width, height = (int(v) for v in args.resolution.split('x'))
+    fixture = make_video(os.path.join(FIXTURE_DIR, f'save_{width}x{height}.mp4'), width, height,
+                         duration=args.frames / 30 + 1)
+    frames = [{'image': image, 'time': t} for _, t, image in app.iter_frames(fixture, 0, args.frames / 30 + 1)][:args.frames]
+
+    results = []
+    try:
+        print(f'{len(frames)} frames at {width}x{height} on {os.cpu_count()} CPUs')
+        print(f'{"format":>6} {"threads":>7} {"frames/s":>9} {"MB/frame":>9}')
+        for image_format in args.format:
+            for threads in args.threads:
+                best = None
+                for _ in range(args.repeat):
+                    output_dir = tempfile.mkdtemp(dir=work_dir)
+                    started = time.perf_counter()
+                    app.write_frames(frames, output_dir, 'bench', image_format=image_format, workers=threads)
+                    elapsed = time.perf_counter() - started
+                    size = sum(entry.stat().st_size for entry in os.scandir(output_dir))
+                    shutil.rmtree(output_dir)
+                    best = elapsed if best is None else min(best, elapsed)
+                result = {
+                    'format': image_format,
+                    'threads': threads,
+                    'frames_per_sec': len(frames) / best,
+                    'bytes_per_frame': size / len(frames)
+                }
+                results.append(result)
+                print(f'{image_format:>6} {threads:>7} {result["frames_per_sec"]:>9.1f} '
+                      f'{result["bytes_per_frame"] / 1e6:>9.2f}')
+    finally:
+        app.shutdown_background_jobs()
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'frames': len(frames), 'resolution': args.resolution, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
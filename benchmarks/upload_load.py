@@ -0,0 +1,110 @@
+"""Load-test Roboflow uploads against the local stub.
+
+Uploads the same frame many times at each concurrency level through the
+app's Roboflow client, with the stub simulating latency, errors and
+throttling, and reports throughput, retries and latency percentiles:
+
+    python benchmarks/upload_load.py --uploads 200 --concurrency 1 4 8 --latency 0.1 --error-rate 0.05 --rate-limit 30
+"""
+import argparse
+import base64
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import cv2
+import numpy as np
+
+import roboflow_stub
+from bench import percentile
+
+
+def test_frame(width, height):
+    """A noisy gradient JPEG, roughly the size of a real frame"""
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None].repeat(height, 0).repeat(3, 2)
+    noise = np.random.default_rng(0).integers(0, 32, (height, width, 3), dtype=np.uint8)
+    _, jpeg = cv2.imencode('.jpg', cv2.add(gradient, noise))
+    return base64.b64encode(jpeg).decode('utf-8')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=100, help='Uploads per concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4], help='Concurrent uploads to test')
+    parser.add_argument('--resolution', default='1280x720', help='Uploaded frame size WIDTHxHEIGHT')
+    parser.add_argument('--retries', type=int, help='Retries per upload (default: app.ROBOFLOW_UPLOAD_RETRIES)')
+    parser.add_argument('--backoff', type=float, help='Initial backoff seconds (default: app.ROBOFLOW_BACKOFF)')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    roboflow_stub.add_behaviour_arguments(parser)
+    args = parser.parse_args(argv)
+    output = os.path.abspath(args.json) if args.json else None
+
+    work_dir = tempfile.mkdtemp(prefix='videoapp_upload_')
+    cwd = os.getcwd()
+    os.chdir(work_dir)  # the app creates its folders relative to the working directory
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')  # failed attempts are counted, not logged
+    import app
+
+    stub, stub_url = roboflow_stub.start(**roboflow_stub.behaviour_options(args))
+    app.ROBOFLOW_API_URL = stub_url
+    if args.retries is not None:
+        app.ROBOFLOW_UPLOAD_RETRIES = args.retries
+    if args.backoff is not None:
+        app.ROBOFLOW_BACKOFF = args.backoff
+    project = app.roboflow_project('load-key', 'https://app.roboflow.com/load/project')
+
+    width, height = (int(v) for v in args.resolution.split('x'))
+    image_data = test_frame(width, height)
+
+    def upload(i):
+        started = time.perf_counter()
+        success, _ = project.upload(image_data, f'load_{i}.jpg')
+        return success, time.perf_counter() - started
+
+    results = []
+    try:
+        print(f'{args.uploads} uploads of {len(base64.b64decode(image_data)) / 1e3:.0f} KB, stub: {roboflow_stub.behaviour_options(args)}')
+        print(f'{"workers":>7} {"uploads/s":>9} {"ok":>5} {"failed":>6} {"attempts":>8} {"429":>5} {"500":>5} '
+              f'{"p50 ms":>8} {"p95 ms":>8}')
+        for concurrency in args.concurrency:
+            stub.reset()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(upload, range(args.uploads)))
+            elapsed = time.perf_counter() - started
+
+            latencies = sorted(seconds for _, seconds in outcomes)
+            result = {
+                'concurrency': concurrency,
+                'uploads_per_sec': args.uploads / elapsed,
+                'succeeded': sum(1 for success, _ in outcomes if success),
+                'failed': sum(1 for success, _ in outcomes if not success),
+                'p50_s': statistics.median(latencies),
+                'p95_s': percentile(latencies, 0.95),
+                **stub.stats()
+            }
+            results.append(result)
+            print(f'{concurrency:>7} {result["uploads_per_sec"]:>9.1f} {result["succeeded"]:>5} {result["failed"]:>6} '
+                  f'{result["attempts"]:>8} {result["throttled"]:>5} {result["errors"]:>5} '
+                  f'{result["p50_s"] * 1000:>8.0f} {result["p95_s"] * 1000:>8.0f}')
+    finally:
+        stub.shutdown()
+        app.shutdown_background_jobs()
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'uploads': args.uploads, 'stub': roboflow_stub.behaviour_options(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
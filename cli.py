@@ -0,0 +1,340 @@
+"""Headless batch extraction using the same functions as the web app.
+
+Examples:
+    python cli.py video1.mp4 video2.mp4 --segment 10:30 --fps 5 --output dataset
+    python cli.py --manifest manifest.json --upload --project-url URL --api-key KEY
+    python cli.py video.mp4 --fps 2 --export yolo --splits train=0.8,valid=0.1,test=0.1
+    python cli.py video.mp4 --fps 2 --roi 640,360,1280,720 --output-size 640x360
+
+Only warnings are logged, to stderr, so stdout carries just the summary and
+per-chunk progress logs don't break up the progress bar; set LOG_LEVEL=INFO
+to see them.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+# Read by logging_setup when app is imported
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('LOG_STREAM', 'stderr')
+
+import app
+from dataset_export import EXPORT_FORMATS, SPLITS, DatasetWriter
+
+WRITE_CHUNK = 64
+
+def parse_segment(value):
+    """Parse START:DURATION (seconds) into a segment dict"""
+    try:
+        start, duration = value.split(':')
+        return {'start_time': float(start), 'duration': float(duration)}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid segment "{value}", expected START:DURATION')
+
+
+def parse_roi(value):
+    """Parse X,Y,WIDTH,HEIGHT (source pixels) into an ROI dict"""
+    try:
+        x, y, width, height = (int(v) for v in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid ROI "{value}", expected X,Y,WIDTH,HEIGHT')
+    return {'x': x, 'y': y, 'width': width, 'height': height}
+
+
+def parse_size(value):
+    """Parse WIDTHxHEIGHT"""
+    try:
+        width, height = (int(v) for v in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid size "{value}", expected WIDTHxHEIGHT')
+    return width, height
+
+
+def parse_splits(value):
+    """Parse SPLIT=RATIO pairs such as train=0.8,valid=0.1,test=0.1"""
+    try:
+        splits = {}
+        for part in value.split(','):
+            split, ratio = part.split('=')
+            splits[split.strip()] = float(ratio)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid splits "{value}", expected e.g. train=0.8,valid=0.2')
+    unknown = set(splits) - set(SPLITS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f'Unknown split: {", ".join(sorted(unknown))}')
+    return splits
+
+
+def manifest_path(entry):
+    """A manifest entry's video file; /add_batch sources are relative to an import root"""
+    if entry.get('path'):
+        return entry['path']
+    source = entry['source']
+    if not os.path.isabs(source) and not os.path.exists(source):
+        for root in app.IMPORT_ROOTS:
+            if os.path.exists(os.path.join(root, source)):
+                return os.path.join(root, source)
+    return source
+
+
+def load_jobs(args):
+    """Build the list of video jobs from positional paths and/or a manifest.
+
+    A manifest is a JSON list (or {"videos": [...]}, as returned by /add_batch)
+    of entries with a "path" or "source" and optional "name", "segments" and
+    "roi" (as accepted by /set_roi).
+    """
+    roi = None
+    if args.roi:
+        roi = dict(args.roi)
+        if args.output_size:
+            roi['output_width'], roi['output_height'] = args.output_size
+    jobs = [{'path': path, 'segments': args.segment, 'roi': roi} for path in args.videos]
+
+    if args.manifest:
+        with open(args.manifest) as f:
+            manifest = json.load(f)
+        entries = manifest['videos'] if isinstance(manifest, dict) else manifest
+        for entry in entries:
+            jobs.append({
+                'path': manifest_path(entry),
+                'name': entry.get('name'),
+                'segments': entry.get('segments') or args.segment,
+                'roi': entry.get('roi') or roi
+            })
+
+    seen = {}
+    for job in jobs:
+        name = job.get('name') or os.path.basename(job['path'])
+        # Keep output directories distinct when videos share a file name
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            stem, ext = os.path.splitext(name)
+            name = f'{stem}_{seen[name]}{ext}'
+        job['name'] = name
+    return jobs
+
+
+def sharpness(image):
+    """Variance of the Laplacian; low values indicate a blurry frame"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+
+def frame_change(image, previous):
+    """Mean absolute difference against the previously kept frame (0-255)"""
+    small = cv2.resize(image, (64, 36), interpolation=cv2.INTER_AREA)
+    prev_small = cv2.resize(previous, (64, 36), interpolation=cv2.INTER_AREA)
+    return float(np.mean(cv2.absdiff(small, prev_small)))
+
+
+def write_chunk(frames, output_dir, video_name, options, start_index, export=None):
+    # Videos already run in parallel processes, so each writes on one thread
+    return app.write_frames(
+        frames, output_dir, video_name, options['roboflow_config'], start_index,
+        image_format=options['format'], workers=1, export=export
+    )
+
+
+def process_video(job, options):
+    """Extract, filter, save and optionally upload the frames of one video"""
+    cv2.setNumThreads(1)  # parallelism comes from running videos in separate processes
+    started = time.time()
+
+    segments = job['segments']
+    roi = job.get('roi')
+    if not segments or roi:
+        metadata = app.probe_video(job['path'])
+        if not metadata:
+            return {'name': job['name'], 'error': 'Cannot open video file'}
+        if not segments:
+            segments = [{'start_time': 0, 'duration': metadata['duration']}]
+        if roi:
+            try:
+                roi = app.parse_roi(roi, metadata['width'], metadata['height'])
+            except ValueError as e:
+                return {'name': job['name'], 'error': str(e)}
+
+    video_name = os.path.splitext(job['name'])[0]
+    output_dir = os.path.join(options['output'], video_name)
+    os.makedirs(output_dir, exist_ok=True)
+    export = None
+    if options['export']:
+        export = DatasetWriter(output_dir, options['export'], splits=options['splits'], image_format=options['format'],
+                               shard_frames=options['shard_frames'], shard_bytes=app.EXPORT_SHARD_BYTES)
+
+    # Frames are written in chunks so whole-video jobs don't accumulate in memory
+    frames = []
+    saved = 0
+    decoded = 0
+    roboflow_results = []
+    previous = None
+    try:
+        # Overlapping segments are merged, as in /extract_frames, so no frame is written twice
+        for segment in app.merge_segments(segments):
+            for frame_num, frame_time, image in app.iter_frames(
+                job['path'], segment['start_time'], segment['duration'], options['fps'],
+                every_nth=options['every_nth'], max_frames=options['max_frames'], roi=roi
+            ):
+                decoded += 1
+                if options['min_sharpness'] and sharpness(image) < options['min_sharpness']:
+                    continue
+                if options['min_change'] and previous is not None and frame_change(image, previous) < options['min_change']:
+                    continue
+                previous = image
+                frames.append({'image': image, 'time': frame_time, 'frame_num': frame_num})
+                if len(frames) >= WRITE_CHUNK:
+                    roboflow_results += write_chunk(frames, output_dir, video_name, options, saved, export)
+                    saved += len(frames)
+                    frames = []
+
+        roboflow_results += write_chunk(frames, output_dir, video_name, options, saved, export)
+        saved += len(frames)
+    finally:
+        if export is not None:
+            export.close()
+
+    if decoded == 0:
+        return {'name': job['name'], 'error': 'No frames extracted'}
+
+    return {
+        'name': job['name'],
+        'output_dir': output_dir,
+        'decoded': decoded,
+        'saved': saved,
+        'uploaded': sum(1 for r in roboflow_results if r['success']),
+        'upload_failed': sum(1 for r in roboflow_results if not r['success']),
+        'seconds': time.time() - started
+    }
+
+
+def render_progress(done, total, frames, elapsed):
+    width = 30
+    filled = int(width * done / total) if total else width
+    rate = frames / elapsed if elapsed > 0 else 0
+    sys.stderr.write(
+        f'\r[{"#" * filled}{"." * (width - filled)}] {done}/{total} videos, '
+        f'{frames} frames, {rate:.1f} frames/s'
+    )
+    sys.stderr.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract frames from videos without the web UI.')
+    parser.add_argument('videos', nargs='*', help='Video files to process')
+    parser.add_argument('--manifest', help='JSON manifest of videos (and optional segments)')
+    parser.add_argument('--segment', action='append', type=parse_segment, default=[],
+                        help='Segment as START:DURATION in seconds; repeatable. Defaults to the whole video')
+    parser.add_argument('--fps', type=float, default=30, help='Target extraction fps (default: 30)')
+    parser.add_argument('--every-nth', type=int, help='Keep every Nth frame (after --fps sampling)')
+    parser.add_argument('--max-frames', type=int, help='Evenly thin each segment to at most this many frames')
+    parser.add_argument('--roi', type=parse_roi,
+                        help='Crop frames to X,Y,WIDTH,HEIGHT (source pixels) right after decode')
+    parser.add_argument('--output-size', type=parse_size, help='Resize cropped frames to WIDTHxHEIGHT (needs --roi)')
+    parser.add_argument('--min-sharpness', type=float, default=0,
+                        help='Drop frames whose Laplacian variance is below this value')
+    parser.add_argument('--min-change', type=float, default=0,
+                        help='Drop frames whose mean difference from the last kept frame is below this value')
+    parser.add_argument('--output', default=app.OUTPUT_FOLDER, help='Output directory')
+    parser.add_argument('--format', default=app.SAVE_FORMAT, choices=sorted(app.SAVE_FORMATS),
+                        help=f'Saved image format (default: {app.SAVE_FORMAT})')
+    parser.add_argument('--export', choices=EXPORT_FORMATS,
+                        help='Write a YOLO or COCO dataset layout, or WebDataset tar shards, with a manifest.json')
+    parser.add_argument('--splits', type=parse_splits,
+                        help='Split ratios for --export, e.g. train=0.8,valid=0.1,test=0.1 (default: all train)')
+    parser.add_argument('--shard-frames', type=int, default=app.EXPORT_SHARD_FRAMES,
+                        help=f'Frames per WebDataset shard (default: {app.EXPORT_SHARD_FRAMES})')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Videos processed in parallel')
+    parser.add_argument('--upload', action='store_true', help='Upload saved frames to Roboflow')
+    parser.add_argument('--project-url', help='Roboflow project URL')
+    parser.add_argument('--api-key', default=os.environ.get('ROBOFLOW_API_KEY'),
+                        help='Roboflow API key (default: $ROBOFLOW_API_KEY)')
+    parser.add_argument('--split', default='train', choices=['train', 'valid', 'test'])
+    parser.add_argument('--batch-name', help='Roboflow batch name (default: video name)')
+    parser.add_argument('--upload-max-size', type=int, help='Downscale uploads so the longest side is at most this many pixels')
+    parser.add_argument('--upload-quality', type=int, help=f'Upload JPEG/WebP quality (default: {app.UPLOAD_QUALITY} when re-encoding)')
+    parser.add_argument('--upload-format', default='jpg', choices=sorted(app.UPLOAD_FORMATS), help='Upload image format')
+    args = parser.parse_args(argv)
+    if args.output_size and not args.roi:
+        parser.error('--output-size requires --roi')
+
+    jobs = load_jobs(args)
+    if not jobs:
+        parser.error('No videos given; pass video paths or --manifest')
+
+    roboflow_config = None
+    if args.upload:
+        if not args.project_url or not args.api_key:
+            parser.error('--upload requires --project-url and --api-key')
+        success, message = app.test_roboflow_connection(args.api_key, args.project_url)
+        if not success:
+            parser.error(message)
+        roboflow_config = {
+            'apiKey': args.api_key,
+            'url': args.project_url,
+            'batchName': args.batch_name,
+            'split': args.split,
+            'uploadMaxSize': args.upload_max_size,
+            'uploadQuality': args.upload_quality,
+            'uploadFormat': args.upload_format
+        }
+        try:
+            app.upload_policy(roboflow_config)
+        except ValueError as e:
+            parser.error(str(e))
+
+    options = {
+        'fps': args.fps,
+        'every_nth': args.every_nth,
+        'max_frames': args.max_frames,
+        'min_sharpness': args.min_sharpness,
+        'min_change': args.min_change,
+        'output': args.output,
+        'format': args.format,
+        'export': args.export,
+        'splits': args.splits,
+        'shard_frames': args.shard_frames,
+        'roboflow_config': roboflow_config
+    }
+
+    started = time.time()
+    results = []
+    frames_saved = 0
+    render_progress(0, len(jobs), 0, 0)
+
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = [pool.submit(process_video, job, options) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'name': '?', 'error': str(e)}
+            results.append(result)
+            frames_saved += result.get('saved', 0)
+            render_progress(len(results), len(jobs), frames_saved, time.time() - started)
+
+    elapsed = time.time() - started
+    sys.stderr.write('\n')
+
+    failed = [r for r in results if 'error' in r]
+    decoded = sum(r.get('decoded', 0) for r in results)
+    print(f'Videos: {len(results) - len(failed)} processed, {len(failed)} failed')
+    print(f'Frames: {decoded} decoded, {frames_saved} saved in {elapsed:.1f}s '
+          f'({decoded / elapsed if elapsed else 0:.1f} decoded/s, {frames_saved / elapsed if elapsed else 0:.1f} saved/s)')
+    if roboflow_config:
+        print(f'Uploads: {sum(r.get("uploaded", 0) for r in results)} succeeded, '
+              f'{sum(r.get("upload_failed", 0) for r in results)} failed')
+    for result in failed:
+        print(f'  {result["name"]}: {result["error"]}')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import threading
+from datetime import datetime
+
+import metrics
+
+# Dataset exports of saved frames. Instead of a flat folder of images, frames
+# are written in a layout training tools read directly:
+#
+#   yolo        <split>/images/<frame>.<ext> and empty <split>/labels/, data.yaml
+#   coco        <split>/<frame>.<ext> and <split>/_annotations.coco.json
+#   webdataset  <split>-000000.tar shards of <key>.<ext> + <key>.json samples,
+#               so large exports are read sequentially instead of as millions
+#               of small files
+#
+# Every export also gets a manifest.json listing each frame's file (or shard),
+# split and source. Splits are assigned by hashing the video and frame name,
+# so re-exporting the same frames puts them in the same splits.
+
+EXPORT_FORMATS = ('yolo', 'coco', 'webdataset')
+SPLITS = ('train', 'valid', 'test')
+MANIFEST_FILE = 'manifest.json'
+
+
+def parse_splits(splits):
+    """Validate split ratios such as {'train': 0.8, 'valid': 0.2}; returns them normalised to sum to 1"""
+    if not splits:
+        return {'train': 1.0}
+    if not isinstance(splits, dict):
+        raise ValueError('Splits must map split names to ratios')
+    unknown = set(splits) - set(SPLITS)
+    if unknown:
+        raise ValueError(f'Unknown split: {", ".join(sorted(unknown))}')
+    try:
+        ratios = {split: float(splits[split]) for split in SPLITS if split in splits}
+    except (TypeError, ValueError):
+        raise ValueError('Split ratios must be numbers')
+    if any(ratio < 0 for ratio in ratios.values()) or sum(ratios.values()) <= 0:
+        raise ValueError('Split ratios must be non-negative and not all zero')
+    total = sum(ratios.values())
+    return {split: ratio / total for split, ratio in ratios.items() if ratio > 0}
+
+
+def assign_split(key, splits):
+    """Pick a split for a frame; the same key always lands in the same split"""
+    position = int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:8], 'big') / 2 ** 64
+    cumulative = 0.0
+    for split, ratio in splits.items():
+        cumulative += ratio
+        if position < cumulative:
+            return split
+    return split
+
+
+class DatasetWriter:
+    """Writes encoded frames into an export layout under root.
+
+    add() may be called from several threads; close() finishes the last
+    shards, writes the layout's metadata and the manifest, and returns a
+    summary of the export.
+    """
+    def __init__(self, root, export_format, splits=None, image_format='jpg', shard_frames=1000, shard_bytes=1024 ** 3):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f'Unsupported export format: {export_format}')
+        self.root = root
+        self.export_format = export_format
+        self.splits = parse_splits(splits)
+        self.image_format = image_format
+        self.shard_frames = shard_frames
+        self.shard_bytes = shard_bytes
+        self.entries = []
+        self.shards = []
+        self._open_shards = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def add(self, video_name, name, data, info):
+        """Add one encoded frame; info holds its time, frame_num, width and height"""
+        split = assign_split(f'{video_name}/{name}', self.splits)
+        filename = f'{name}.{self.image_format}'
+        entry = {'split': split, 'video': video_name, **info}
+
+        with self._lock:
+            if self.export_format == 'webdataset':
+                # WebDataset groups a sample's files by the name up to the first dot
+                key = name.replace('.', '_')
+                shard = self._shard(split, len(data))
+                self._add_member(shard, f'{key}.{self.image_format}', data)
+                self._add_member(shard, f'{key}.json', json.dumps(entry).encode('utf-8'))
+                entry.update(shard=os.path.basename(shard['path']), key=key)
+            else:
+                if self.export_format == 'yolo':
+                    relative_path = os.path.join(split, 'images', filename)
+                else:
+                    relative_path = os.path.join(split, filename)
+                with metrics.timed('image_write'):
+                    write_file(os.path.join(self.root, relative_path), data)
+                entry['file'] = relative_path
+            self.entries.append(entry)
+
+    def close(self):
+        with self._lock:
+            for split in list(self._open_shards):
+                self._close_shard(split)
+
+            present = [split for split in SPLITS if any(e['split'] == split for e in self.entries)]
+            if self.export_format == 'yolo':
+                self._write_yolo(present)
+            elif self.export_format == 'coco':
+                self._write_coco(present)
+
+            summary = {
+                'format': self.export_format,
+                'root': self.root,
+                'frames': len(self.entries),
+                'splits': {split: sum(1 for e in self.entries if e['split'] == split) for split in present},
+                'manifest': os.path.join(self.root, MANIFEST_FILE)
+            }
+            if self.shards:
+                summary['shards'] = len(self.shards)
+
+            manifest = {
+                'format': self.export_format,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'image_format': self.image_format,
+                'split_ratios': self.splits,
+                'splits': summary['splits'],
+                'shards': self.shards,
+                'frames': self.entries
+            }
+            write_file(summary['manifest'], json.dumps(manifest, indent=2).encode('utf-8'))
+            return summary
+
+    def _shard(self, split, nbytes):
+        """The open shard for a split, starting a new one when the current one is full"""
+        shard = self._open_shards.get(split)
+        if shard is not None and (shard['frames'] >= self.shard_frames or
+                                  shard['frames'] and shard['bytes'] + nbytes > self.shard_bytes):
+            self._close_shard(split)
+            shard = None
+        if shard is None:
+            index = sum(1 for s in self.shards if s['split'] == split)
+            path = os.path.join(self.root, f'{split}-{index:06d}.tar')
+            shard = self._open_shards[split] = {
+                'path': path,
+                'tar': tarfile.open(path + '.part', 'w'),
+                'frames': 0,
+                'bytes': 0
+            }
+        shard['frames'] += 1
+        shard['bytes'] += nbytes
+        return shard
+
+    def _add_member(self, shard, name, data):
+        member = tarfile.TarInfo(name)
+        member.size = len(data)
+        member.mtime = int(datetime.now().timestamp())
+        with metrics.timed('image_write'):
+            shard['tar'].addfile(member, io.BytesIO(data))
+
+    def _close_shard(self, split):
+        shard = self._open_shards.pop(split)
+        shard['tar'].close()
+        os.replace(shard['path'] + '.part', shard['path'])
+        self.shards.append({
+            'file': os.path.basename(shard['path']),
+            'split': split,
+            'frames': shard['frames'],
+            'bytes': os.path.getsize(shard['path'])
+        })
+
+    def _write_yolo(self, splits):
+        # Frames are unlabeled; empty label directories keep the layout valid
+        for split in splits:
+            os.makedirs(os.path.join(self.root, split, 'labels'), exist_ok=True)
+        lines = [f'{"val" if split == "valid" else split}: {split}/images' for split in splits]
+        lines += ['nc: 0', 'names: []']
+        write_file(os.path.join(self.root, 'data.yaml'), ('\n'.join(lines) + '\n').encode('utf-8'))
+
+    def _write_coco(self, splits):
+        for split in splits:
+            images = [
+                {
+                    'id': image_id,
+                    'file_name': os.path.basename(entry['file']),
+                    'width': entry['width'],
+                    'height': entry['height'],
+                    'video': entry['video'],
+                    'frame_num': entry.get('frame_num'),
+                    'time': entry['time']
+                }
+                for image_id, entry in enumerate(e for e in self.entries if e['split'] == split)
+            ]
+            annotations = {
+                'info': {'description': 'Exported video frames', 'date_created': datetime.now().isoformat(timespec='seconds')},
+                'images': images,
+                'annotations': [],
+                'categories': []
+            }
+            write_file(os.path.join(self.root, split, '_annotations.coco.json'), json.dumps(annotations).encode('utf-8'))
+
+
+def write_file(path, data):
+    """Write bytes atomically via a temporary file, creating its directory if needed"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial_path = path + '.part'
+    with open(partial_path, 'wb') as f:
+        f.write(data)
+    os.replace(partial_path, path)
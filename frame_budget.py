@@ -0,0 +1,95 @@
+import threading
+import time
+
+# Memory accounting for extracted preview frames. Every /extract_frames
+# request holds its base64 JPEGs in memory until the response is sent; a
+# shared MemoryBudget caps the total across concurrent requests (per worker
+# process) and each request's FrameBuffer caps its own share. Frames that
+# don't fit are left in the on-disk frame store and served by URL instead.
+
+
+class BudgetExceeded(Exception):
+    """A request would reference more spilled frame bytes than its hard cap allows"""
+
+
+class MemoryBudget:
+    """Byte counter shared by all requests; reserve() waits while it is exhausted"""
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+
+    def reserve(self, nbytes, timeout):
+        """Take nbytes from the budget, waiting up to timeout seconds; False if it never fits"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.used + nbytes > self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.used += nbytes
+            self.peak = max(self.peak, self.used)
+            return True
+
+    def release(self, nbytes):
+        with self._condition:
+            self.used -= nbytes
+            self._condition.notify_all()
+
+
+class FrameBuffer:
+    """One request's share of the budget, spilling to disk once it is used up.
+
+    Producers call reserve() before base64-encoding a frame; when it returns
+    False the frame is served from disk and recorded with spill() instead.
+    If the shared budget is exhausted, reserve() blocks for up to
+    wait_timeout so extraction slows down instead of growing memory.
+    release() must be called once the response has been sent.
+    """
+    def __init__(self, budget, request_limit, spill_limit, wait_timeout):
+        self.budget = budget
+        self.request_limit = request_limit
+        self.spill_limit = spill_limit
+        self.wait_timeout = wait_timeout
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self.spilled_frames = 0
+        self.wait_seconds = 0.0
+        self._released = False
+
+    def reserve(self, jpeg):
+        """Account for a JPEG's base64 form; True if it may be kept in memory"""
+        nbytes = (len(jpeg) + 2) // 3 * 4
+        if self.spilled_frames or self.memory_bytes + nbytes > self.request_limit:
+            # Once spilling, keep spilling so memory isn't handed back and forth
+            return False
+
+        started = time.monotonic()
+        admitted = self.budget.reserve(nbytes, self.wait_timeout)
+        self.wait_seconds += time.monotonic() - started
+        if admitted:
+            self.memory_bytes += nbytes
+        return admitted
+
+    def spill(self, jpeg):
+        """Record a frame served from disk; raises BudgetExceeded past the hard cap"""
+        if self.spilled_bytes + len(jpeg) > self.spill_limit:
+            raise BudgetExceeded(f'Segment needs more than {self.spill_limit // (1024 * 1024)} MB of frame storage')
+        self.spilled_bytes += len(jpeg)
+        self.spilled_frames += 1
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.budget.release(self.memory_bytes)
+
+    def usage(self):
+        return {
+            'memory_bytes': self.memory_bytes,
+            'spilled_bytes': self.spilled_bytes,
+            'spilled_frames': self.spilled_frames,
+            'wait_seconds': round(self.wait_seconds, 3)
+        }
+
@@ -0,0 +1,215 @@
+import mmap
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: waitress runs a single process, so thread locks suffice
+    fcntl = None
+
+# Disk-backed store of encoded preview frames, so a segment that was viewed
+# before is served without touching the decoder. Each video gets a directory
+# holding an append-only segment file of JPEGs and an index array with one
+# (offset, length, source) row per frame number; rows of -1 are frames not
+# stored yet. Frames are read back through mmap. When the store grows past
+# its disk budget, the least recently used videos are evicted whole.
+# Another process may evict a video while this one has it open, so each
+# Segment keeps its data file open and starts over when the file on disk is
+# no longer the one it holds.
+
+DATA_FILE = 'frames.bin'
+INDEX_FILE = 'index.npy'
+
+SOURCE_ORIGINAL = 0
+SOURCE_PROXY = 1
+
+
+class Segment:
+    """One video's stored frames; hold its lock while reading or appending"""
+    def __init__(self, directory):
+        self.directory = directory
+        self.data_path = os.path.join(directory, DATA_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.lock = threading.Lock()
+        self._map = None
+        self._data_file = None
+        self._restart()
+        self.refresh()
+
+    def refresh(self):
+        """Pick up frames stored by other processes since the index was loaded (or last flushed)"""
+        if not self._current():
+            self._restart()
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self.index_mtime:
+            self._merge(np.load(self.index_path))
+            self.index_mtime = mtime
+
+    def has(self, frame_num):
+        return frame_num < len(self.index) and self.index[frame_num, 0] >= 0
+
+    def source(self, frame_num):
+        return int(self.index[frame_num, 2])
+
+    def get(self, frame_num):
+        """Return a stored frame's JPEG bytes as a zero-copy memoryview"""
+        offset, length, _ = (int(v) for v in self.index[frame_num])
+        if self._map is None or offset + length > len(self._map):
+            self._remap()
+        return memoryview(self._map)[offset:offset + length]
+
+    def append(self, frame_num, jpeg, source):
+        with file_lock(self._data_file):
+            offset = os.fstat(self._data_file.fileno()).st_size
+            self._data_file.write(jpeg)
+            self._data_file.flush()
+        self._grow(frame_num + 1)
+        self.index[frame_num] = (offset, len(jpeg), source)
+        self.dirty = True
+
+    def flush(self):
+        """Persist the index, merging entries written by other processes"""
+        if not self.dirty:
+            return
+        with file_lock(self._data_file):
+            if not self._current():
+                # Evicted since refresh(): the offsets point into the deleted
+                # file, which stays readable through our handle until the next
+                # refresh() starts over, but must not reach the new directory
+                self.dirty = False
+                return
+            if os.path.exists(self.index_path):
+                self._merge(np.load(self.index_path))
+            partial_path = self.index_path + '.part.npy'
+            np.save(partial_path, self.index)
+            os.replace(partial_path, self.index_path)
+            self.index_mtime = os.stat(self.index_path).st_mtime_ns
+        self.dirty = False
+
+    def size(self):
+        try:
+            return os.path.getsize(self.data_path)
+        except FileNotFoundError:
+            return 0
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # a frame is still being sent; the map closes when it is released
+            self._map = None
+        if self._data_file is not None:
+            self._data_file.close()
+            self._data_file = None
+
+    def _current(self):
+        """Whether the data file on disk is still the one this Segment has open"""
+        if self._data_file is None:
+            return False
+        try:
+            return os.stat(self.data_path).st_ino == os.fstat(self._data_file.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _restart(self):
+        """Drop everything known about the old directory and open (or recreate) the current one"""
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        # The open file pins its inode, so a recreated file never looks current
+        self._data_file = open(self.data_path, 'a+b')
+        self.index = np.full((0, 3), -1, dtype=np.int64)
+        self.index_mtime = None
+        self.dirty = False
+
+    def _remap(self):
+        # Map the file this Segment holds, not whatever is at data_path now.
+        # The old map is left for garbage collection since frames returned by
+        # get() may still reference it
+        self._map = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _grow(self, length):
+        if length > len(self.index):
+            grown = np.full((max(length, len(self.index) * 2), 3), -1, dtype=np.int64)
+            grown[:len(self.index)] = self.index
+            self.index = grown
+
+    def _merge(self, other):
+        self._grow(len(other))
+        missing = self.index[:len(other), 0] < 0
+        self.index[:len(other)][missing] = other[missing]
+
+
+class FrameStore:
+    """Per-video Segments under root, kept within budget bytes by LRU eviction"""
+    def __init__(self, root, budget):
+        self.root = root
+        self.budget = budget
+        self._segments = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def segment(self, key):
+        """Return the Segment for a video key, creating it if needed"""
+        directory = os.path.join(self.root, key)
+        with self._lock:
+            segment = self._segments.get(key)
+            if segment is not None and not os.path.isdir(directory):
+                # Evicted by another process
+                segment.close()
+                segment = None
+            if segment is None:
+                segment = self._segments[key] = Segment(directory)
+        # Directory mtime records last use for LRU eviction across processes
+        os.utime(directory)
+        return segment
+
+    def remove(self, key):
+        with self._lock:
+            segment = self._segments.pop(key, None)
+        if segment is not None:
+            with segment.lock:
+                segment.close()
+        shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+
+    def evict(self, keep=None):
+        """Delete least recently used videos until the store fits its budget"""
+        entries = []
+        for key in os.listdir(self.root):
+            directory = os.path.join(self.root, key)
+            try:
+                entries.append((os.stat(directory).st_mtime, key, os.path.getsize(os.path.join(directory, DATA_FILE))))
+            except FileNotFoundError:
+                continue
+
+        total = sum(size for _, _, size in entries)
+        evicted = []
+        for _, key, size in sorted(entries):
+            if total <= self.budget:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            total -= size
+            evicted.append(key)
+        return evicted
+
+
+@contextmanager
+def file_lock(f):
+    """Exclusive advisory lock on an open file, where the platform supports it"""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,34 @@
+# gunicorn configuration: gunicorn -c gunicorn.conf.py
+# Every setting can be overridden with the environment variables below.
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:application'
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+
+# Decoding and encoding in OpenCV release the GIL, so each process also runs
+# a few threads. Sessions live in SQLite, so any worker can serve any request.
+workers = int(os.environ.get('WEB_WORKERS', min(4, multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+
+# Extraction and upload requests can legitimately take minutes
+timeout = int(os.environ.get('WEB_TIMEOUT', 600))
+# On SIGTERM, in-flight requests get this long to finish before workers are killed
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 120))
+keepalive = 5
+
+accesslog = '-'
+
+
+def worker_exit(server, worker):
+    # Cancel queued proxy transcodes and stop running ones in this worker
+    from app import shutdown_background_jobs
+    shutdown_background_jobs()
+
+
+def child_exit(server, worker):
+    # With PROMETHEUS_MULTIPROC_DIR set, drop the exited worker's live gauges
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
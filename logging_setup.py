@@ -0,0 +1,118 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# Structured JSON logging that never blocks the caller: records go onto an
+# in-memory queue and a background listener thread writes them to stdout.
+#
+#   LOG_LEVEL              level for the 'videoapp' loggers (default INFO)
+#   LOG_FRAME_SAMPLE_RATE  fraction of per-frame events kept (default 0.01)
+#   LOG_FORMAT             'json' (default) or 'text'
+#   LOG_STREAM             'stdout' (default) or 'stderr'
+
+FRAME_LOGGER = 'videoapp.frames'
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+# The request being served. The app sets it per request; threads doing a
+# request's work run in a copy of its context, so their records carry it too.
+current_request_id = contextvars.ContextVar('request_id', default=None)
+
+_listener = None
+_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class MessageFormatter(logging.Formatter):
+    """Render only the message before queueing; tracebacks travel as an 'exc' field"""
+    def format(self, record):
+        if record.exc_info and not hasattr(record, 'exc'):
+            record.exc = self.formatException(record.exc_info)
+        return record.getMessage()
+
+
+class RequestIdFilter(logging.Filter):
+    """Tag records with the current request id; runs in the logging thread's caller"""
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = current_request_id.get()
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Keep only a random fraction of records (used for per-frame events)"""
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def configure_logging():
+    """Route the app's loggers through a queue to a background JSON writer"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    sample_rate = float(os.environ.get('LOG_FRAME_SAMPLE_RATE', '0.01'))
+
+    stream_handler = logging.StreamHandler(sys.stderr if os.environ.get('LOG_STREAM') == 'stderr' else sys.stdout)
+    if os.environ.get('LOG_FORMAT', 'json') == 'text':
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    _handler = logging.handlers.QueueHandler(log_queue)
+    _handler.setFormatter(MessageFormatter())
+    _handler.addFilter(RequestIdFilter())
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger = logging.getLogger('videoapp')
+    logger.setLevel(level)
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+    logging.getLogger(FRAME_LOGGER).addFilter(SampleFilter(sample_rate))
+
+    # Forked children (e.g. the CLI's process pool) don't inherit the listener thread
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_listener)
+
+
+def _restart_listener():
+    global _listener
+    if _listener is None:
+        return
+    _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+
+# Prometheus metrics for the extraction, save and upload hot paths.
+# Under gunicorn set PROMETHEUS_MULTIPROC_DIR so /metrics aggregates all workers.
+
+# Per-frame stages are sub-millisecond to tens of milliseconds; uploads and
+# whole requests take seconds, so the buckets span both.
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120
+)
+
+STAGE_SECONDS = Histogram(
+    'videoapp_stage_seconds',
+    'Time spent in a pipeline stage (decode, seek, jpeg_encode, base64, upload, ...)',
+    ['stage'],
+    buckets=LATENCY_BUCKETS
+)
+
+REQUEST_SECONDS = Histogram(
+    'videoapp_request_seconds',
+    'HTTP request latency by endpoint',
+    ['endpoint'],
+    buckets=LATENCY_BUCKETS
+)
+
+DOWNLOAD_SPEED = Histogram(
+    'videoapp_youtube_download_bytes_per_second',
+    'Average speed of completed YouTube downloads',
+    buckets=(1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7, 1e8)
+)
+
+VIDEO_BYTES_SERVED = Counter(
+    'videoapp_video_bytes_served',
+    'Bytes streamed by /video for browser preview'
+)
+
+CACHE_REQUESTS = Counter(
+    'videoapp_cache_requests',
+    'Cache lookups by cache and result (hit or miss)',
+    ['cache', 'result']
+)
+
+PROXY_QUEUE_DEPTH = Gauge(
+    'videoapp_proxy_queue_depth',
+    'Proxy transcodes queued or running',
+    multiprocess_mode='livesum'
+)
+
+QUEUED_VIDEOS = Gauge(
+    'videoapp_queued_videos',
+    'Videos registered across all sessions',
+    multiprocess_mode='max'
+)
+
+EXTRACT_MEMORY_BYTES = Gauge(
+    'videoapp_extract_memory_bytes',
+    'Preview frame bytes held in memory by in-flight /extract_frames responses',
+    multiprocess_mode='livesum'
+)
+
+UPLOAD_BYTES = Counter(
+    'videoapp_upload_bytes',
+    'Image bytes accepted by Roboflow (retries are not counted)'
+)
+
+UPLOAD_RETRIES = Counter(
+    'videoapp_upload_retries',
+    'Roboflow upload attempts retried, by reason (throttled, server_error, connection)',
+    ['reason']
+)
+
+SPILLED_BYTES = Counter(
+    'videoapp_spilled_bytes',
+    'Preview frame bytes spilled to disk because a memory budget was exhausted'
+)
+
+SAVE_STAGE_UTILIZATION = Histogram(
+    'videoapp_save_stage_utilization',
+    'Fraction of a save pipeline run each stage spent busy; the highest is the bottleneck',
+    ['stage'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1)
+)
+
+_stages = {}
+# Worker threads doing a request's work have no request context; they record
+# into the request's stage timings through this (see stage_timings_to)
+_thread_timings = threading.local()
+_timings_lock = threading.Lock()
+
+def observe_stage(stage, seconds):
+    child = _stages.get(stage)
+    if child is None:
+        child = _stages[stage] = STAGE_SECONDS.labels(stage)
+    child.observe(seconds)
+    
+    # Requests that asked for a timing breakdown also accumulate per-stage totals
+    timings = getattr(_thread_timings, 'timings', None)
+    if timings is None and has_request_context():
+        timings = g.get('stage_timings')
+    if timings is not None:
+        with _timings_lock:
+            totals = timings.setdefault(stage, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+@contextmanager
+def stage_timings_to(timings):
+    """Record stages timed on this thread into a request's stage timings"""
+    previous = getattr(_thread_timings, 'timings', None)
+    _thread_timings.timings = timings
+    try:
+        yield
+    finally:
+        _thread_timings.timings = previous
+
+@contextmanager
+def timed(stage):
+    """Time a block and record it under the given stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+def cache_result(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+def render():
+    """Return the exposition body and content type for /metrics"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from frame_store import file_lock
+
+# Perceptual hashes of the frames uploaded to each Roboflow project, so
+# near-duplicates (the same scene in several clips) can be skipped or flagged
+# before they are uploaded again. A pHash is the sign pattern of the lowest
+# 8x8 DCT coefficients of a 32x32 grayscale thumbnail packed into a uint64;
+# visually similar frames differ in only a few of the 64 bits. Each project's
+# hashes are one .npy array searched with a vectorized Hamming scan, which
+# stays in the low milliseconds up to millions of hashes.
+
+
+def phash(image):
+    """64-bit perceptual hash of a BGR or grayscale image"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    # The DC term only reflects overall brightness, so it is left out of the median
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming_distances(hashes, value):
+    """Bit distance from value to each hash in a uint64 array"""
+    return np.bitwise_count(hashes ^ np.uint64(value))
+
+
+class HashIndex:
+    """One project's uploaded-frame hashes, persisted at path and shared across processes"""
+    def __init__(self, path):
+        self.path = path
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.mtime = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Pick up hashes added by other processes"""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime != self.mtime:
+                self.hashes = np.load(self.path)
+                self.mtime = mtime
+
+    def nearest(self, value):
+        """Distance to the closest stored hash, or None if the index is empty"""
+        hashes = self.hashes
+        if not len(hashes):
+            return None
+        return int(hamming_distances(hashes, value).min())
+
+    def add(self, values):
+        """Persist new hashes, merging with any added meanwhile by other processes"""
+        if not values:
+            return
+        with self._lock, open(self.path + '.lock', 'a') as lock_file, file_lock(lock_file):
+            stored = np.load(self.path) if os.path.exists(self.path) else np.zeros(0, dtype=np.uint64)
+            hashes = np.concatenate([stored, np.array(values, dtype=np.uint64)])
+            partial_path = self.path + '.part.npy'
+            np.save(partial_path, hashes)
+            os.replace(partial_path, self.path)
+            self.hashes = hashes
+            self.mtime = os.stat(self.path).st_mtime_ns
+
+
+class HashIndexStore:
+    """A HashIndex per project, stored under root"""
+    def __init__(self, root):
+        self.root = root
+        self._indexes = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def index(self, project):
+        key = hashlib.sha1(project.encode('utf-8')).hexdigest()[:16]
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = HashIndex(os.path.join(self.root, f'{key}.npy'))
+        index.refresh()
+        return index
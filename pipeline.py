@@ -0,0 +1,156 @@
+import contextvars
+import queue
+import threading
+import time
+
+# A small staged producer/consumer pipeline. A source iterable feeds one or
+# more stages, each run by its own threads and connected by bounded queues,
+# so a slow stage applies backpressure instead of letting work pile up in
+# memory. A stage can feed several downstream stages (fan-out), e.g. the
+# same encoded frame going to both disk and upload. Each stage records how
+# long its workers were busy so the bottleneck shows up as the stage with
+# the highest utilization. Every thread runs in a copy of the caller's
+# contextvars, so context such as the logging request id follows the work.
+
+_DONE = object()
+
+
+class Stage:
+    """A pipeline step run by `workers` threads.
+
+    fn(item) returns the item passed downstream; stages with nothing
+    downstream have their non-None return values collected as results.
+    """
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inbox = None
+        self.downstream = []
+        self.results = []
+        self.busy_seconds = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+        self._running = 0
+
+    def _record(self, seconds, result):
+        with self._lock:
+            self.busy_seconds += seconds
+            self.items += 1
+            if result is not None and not self.downstream:
+                self.results.append(result)
+
+
+class Pipeline:
+    """Stages fed from source. thread_context, if given, is called on each
+    pipeline thread for a context manager wrapped around all its work."""
+    def __init__(self, source, source_name='source', queue_size=8, thread_context=None):
+        self.source = Stage(source_name, None)
+        self._iterable = source
+        self.queue_size = queue_size
+        self.thread_context = thread_context
+        self.stages = {source_name: self.source}
+        self._error = None
+        self._abort = threading.Event()
+
+    def add(self, stage, after):
+        """Add a stage fed by the named upstream stage (or the source)"""
+        stage.inbox = queue.Queue(maxsize=self.queue_size)
+        self.stages[after].downstream.append(stage)
+        self.stages[stage.name] = stage
+        return stage
+
+    def run(self):
+        """Run to completion; returns per-stage stats and re-raises the first error"""
+        started = time.perf_counter()
+        # A context can only be entered by one thread at a time, so each gets its own copy
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(self._in_context, self._produce),
+                                    name=f'pipeline-{self.source.name}')]
+        for stage in self.stages.values():
+            if stage is self.source:
+                continue
+            stage._running = stage.workers
+            threads += [
+                threading.Thread(target=contextvars.copy_context().run, args=(self._in_context, self._work, stage),
+                                 name=f'pipeline-{stage.name}-{i}')
+                for i in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        if self._error is not None:
+            raise self._error
+        return {
+            'wall_seconds': round(wall, 3),
+            'stages': {
+                name: {
+                    'workers': stage.workers,
+                    'items': stage.items,
+                    'busy_seconds': round(stage.busy_seconds, 3),
+                    'utilization': round(stage.busy_seconds / (wall * stage.workers), 3) if wall > 0 else 0
+                }
+                for name, stage in self.stages.items()
+            }
+        }
+
+    def results(self, name):
+        return self.stages[name].results
+
+    def _in_context(self, target, *args):
+        if self.thread_context is None:
+            return target(*args)
+        with self.thread_context():
+            return target(*args)
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._abort.set()
+
+    def _produce(self):
+        stage = self.source
+        iterator = iter(self._iterable)
+        try:
+            while not self._abort.is_set():
+                started = time.perf_counter()
+                item = next(iterator, _DONE)
+                if item is _DONE:
+                    break
+                stage._record(time.perf_counter() - started, item)
+                for downstream in stage.downstream:
+                    downstream.inbox.put(item)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for downstream in stage.downstream:
+                downstream.inbox.put(_DONE)
+
+    def _work(self, stage):
+        while True:
+            item = stage.inbox.get()
+            if item is _DONE:
+                break
+            if self._abort.is_set():
+                continue  # keep draining so upstream stages never block
+            try:
+                started = time.perf_counter()
+                result = stage.fn(item)
+                stage._record(time.perf_counter() - started, result)
+            except Exception as e:
+                self._fail(e)
+                continue
+            if result is not None:
+                for downstream in stage.downstream:
+                    downstream.inbox.put(result)
+
+        with stage._lock:
+            stage._running -= 1
+            last = stage._running == 0
+        if last:
+            for downstream in stage.downstream:
+                downstream.inbox.put(_DONE)
+        else:
+            stage.inbox.put(_DONE)  # wake the next sibling worker
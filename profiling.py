@@ -0,0 +1,144 @@
+import cProfile
+import hmac
+import os
+import pstats
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import g, has_request_context
+
+import metrics
+
+# Opt-in per-request profiling. A request is profiled when it carries the
+# admin token (X-Admin-Token header) and asks for it with an X-Profile: 1
+# header or ?profile=1. Profiles are saved as pstats files in PROFILE_FOLDER
+# and can be downloaded as pstats or callgrind (which speedscope and
+# KCachegrind open directly).
+
+PROFILE_FOLDER = 'profiles'
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# cProfile can only instrument one request at a time reliably (Python 3.12+
+# allows a single active profiler per process), so concurrent requests skip it.
+_profile_lock = threading.Lock()
+
+def is_admin(request):
+    # Header only: query strings end up in access logs
+    token = request.headers.get('X-Admin-Token')
+    return bool(ADMIN_TOKEN and token and hmac.compare_digest(token, ADMIN_TOKEN))
+
+def wants_profile(request):
+    flag = request.headers.get('X-Profile') or request.args.get('profile')
+    return flag in ('1', 'true') and is_admin(request)
+
+def start():
+    """Start profiling the current thread, or return None if another profile is running"""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        _profile_lock.release()
+        return None
+    return profiler
+
+def stop(profiler, endpoint=None, thread_profiles=()):
+    """Stop a profiler; when an endpoint is given, save the profile, merged
+    with any thread_profiles from worker threads, and return its id"""
+    profiler.disable()
+    _profile_lock.release()
+    if endpoint is None:
+        return None
+
+    os.makedirs(PROFILE_FOLDER, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    profile_id = f'{timestamp}_{endpoint}_{uuid.uuid4().hex[:8]}'
+    stats = pstats.Stats(profiler)
+    for thread_profile in thread_profiles:
+        stats.add(thread_profile)
+    stats.dump_stats(profile_path(profile_id))
+    return profile_id
+
+def worker_context():
+    """Extend the current request's profiling to worker threads.
+
+    Returns a factory of context managers, entered by each thread doing
+    the request's work, that records its stage timings into the request's
+    Server-Timing breakdown and profiles it for the request's cProfile; or
+    None when the request is not being profiled.
+    """
+    if not has_request_context() or 'stage_timings' not in g:
+        return None
+    timings = g.stage_timings
+    thread_profiles = g.setdefault('thread_profiles', []) if g.get('profiler') else None
+
+    @contextmanager
+    def context():
+        with metrics.stage_timings_to(timings):
+            if thread_profiles is None:
+                yield
+                return
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows only one active profiler per process
+                yield
+                return
+            try:
+                yield
+            finally:
+                profiler.disable()
+                thread_profiles.append(profiler)
+    return context
+
+def profile_path(profile_id):
+    return os.path.join(PROFILE_FOLDER, os.path.basename(profile_id) + '.pstats')
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_FOLDER):
+        return []
+    return sorted(
+        (name[:-len('.pstats')] for name in os.listdir(PROFILE_FOLDER) if name.endswith('.pstats')),
+        reverse=True
+    )
+
+def to_callgrind(profile_id):
+    """Convert a saved profile to callgrind text (costs in microseconds)"""
+    stats = pstats.Stats(profile_path(profile_id)).stats
+
+    # pstats records callers per function; callgrind wants callees
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, (_, nc, _, ct) in callers.items():
+            callees.setdefault(caller, []).append((func, nc, ct))
+
+    def name(func):
+        filename, line, funcname = func
+        return f'{funcname} {filename}:{line}'
+
+    lines = ['# callgrind format', 'version: 1', 'creator: video_keyframe_app', 'events: Microseconds', '']
+    for func, (_, _, tt, _, _) in stats.items():
+        filename, line, _ = func
+        lines.append(f'fl={filename}')
+        lines.append(f'fn={name(func)}')
+        lines.append(f'{line} {int(tt * 1e6)}')
+        for callee, nc, ct in callees.get(func, []):
+            lines.append(f'cfl={callee[0]}')
+            lines.append(f'cfn={name(callee)}')
+            lines.append(f'calls={nc} {callee[1]}')
+            lines.append(f'{line} {int(ct * 1e6)}')
+        lines.append('')
+    return '\n'.join(lines)
+
+def server_timing(stage_timings, total_seconds):
+    """Format accumulated {stage: [seconds, count]} as a Server-Timing header value"""
+    entries = [
+        f'{stage};dur={seconds * 1000:.1f};desc="{count}x"'
+        for stage, (seconds, count) in stage_timings.items()
+    ]
+    entries.append(f'total;dur={total_seconds * 1000:.1f}')
+    return ', '.join(entries)
@@ -0,0 +1,181 @@
+import base64
+import logging
+import mimetypes
+import random
+import threading
+import time
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError
+
+import metrics
+from logging_setup import FRAME_LOGGER
+
+logger = logging.getLogger('videoapp')
+frame_logger = logging.getLogger(FRAME_LOGGER)
+
+# Client for one Roboflow project. The project URL is parsed once when the
+# client is created, a successful validation of (API key, project) is cached
+# for a TTL so every save can check its config up front without an extra
+# round trip per batch, and uploads reuse keep-alive connections through one
+# requests.Session per thread. Uploads that hit a 429 or 5xx response, or
+# that could not connect, are retried with exponential backoff and jitter,
+# honouring Retry-After when the server sends one. Errors after the image
+# may have been sent (e.g. read timeouts) are not retried, since the upload
+# may have landed and a retry would add a duplicate to the project.
+
+_validated = {}
+_validated_lock = threading.Lock()
+_sessions = threading.local()
+
+
+def parse_project_url(project_url):
+    """Return (workspace, project) from a Roboflow project URL; raises ValueError"""
+    project_url = project_url.rstrip('/')
+    if 'roboflow.com' not in project_url:
+        raise ValueError('Invalid Roboflow URL format')
+    parts = project_url.split('/')
+    for i, part in enumerate(parts):
+        if 'roboflow.com' in part and i + 2 < len(parts):
+            return parts[i + 1], parts[i + 2]
+    raise ValueError('Could not parse workspace and project from URL')
+
+
+def _never_sent(error):
+    """Whether a failed request certainly did not reach the server"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError) or not error.args:
+        return False
+    # Connection failures arrive wrapped in urllib3's MaxRetryError
+    reason = getattr(error.args[0], 'reason', error.args[0])
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def _session():
+    session = getattr(_sessions, 'session', None)
+    if session is None:
+        session = _sessions.session = requests.Session()
+    return session
+
+
+class RoboflowProject:
+    """A parsed project URL bound to an API key; create once and reuse for a batch"""
+    def __init__(self, api_key, project_url, api_url, validation_ttl=300, retries=4, backoff=0.5, backoff_max=30,
+                 timeout=60):
+        self.workspace, self.project = parse_project_url(project_url)
+        self.api_key = api_key
+        self.api_url = api_url.rstrip('/')
+        self.validation_ttl = validation_ttl
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.upload_url = f'{self.api_url}/dataset/{self.project}/upload'
+
+    @property
+    def name(self):
+        return f'{self.workspace}/{self.project}'
+
+    def validate(self):
+        """Check the project and API key, reusing a success for validation_ttl seconds"""
+        key = (self.api_url, self.api_key, self.workspace, self.project)
+        with _validated_lock:
+            cached = _validated.get(key, 0) > time.monotonic()
+        metrics.cache_result('roboflow_project', cached)
+        if cached:
+            return True, f'Connected to {self.name}'
+
+        try:
+            response = _session().get(f'{self.api_url}/{self.name}', params={'api_key': self.api_key}, timeout=self.timeout)
+        except requests.RequestException as e:
+            return False, f'Connection error: {e}'
+        if response.status_code != 200:
+            return False, f'Invalid project or API key: {response.text}'
+
+        with _validated_lock:
+            _validated[key] = time.monotonic() + self.validation_ttl
+        return True, f'Connected to {self.name}'
+
+    def upload(self, image_data, image_name, split='train', batch_name=None):
+        """Upload a base64-encoded image; returns (success, message)"""
+        try:
+            image_bytes = base64.b64decode(image_data)
+            content_type = mimetypes.guess_type(image_name)[0] or 'image/jpeg'
+            params = {
+                'api_key': self.api_key,
+                'name': image_name,
+                'split': split
+            }
+            if batch_name:
+                params['batch'] = batch_name
+
+            for attempt in range(self.retries + 1):
+                started = time.perf_counter()
+                try:
+                    with metrics.timed('upload'):
+                        response = _session().post(
+                            self.upload_url,
+                            files={'file': (image_name, image_bytes, content_type)},
+                            params=params,
+                            timeout=self.timeout
+                        )
+                except requests.RequestException as e:
+                    if not _never_sent(e) or attempt == self.retries:
+                        raise
+                    self._retry('connection', attempt, image_name)
+                    continue
+
+                # Per-frame event: sampled at LOG_FRAME_SAMPLE_RATE unless it failed
+                frame_logger.log(
+                    logging.INFO if response.status_code == 200 else logging.WARNING,
+                    'Roboflow upload',
+                    extra={
+                        'project': self.project,
+                        'image_name': image_name,
+                        'split': split,
+                        'batch': batch_name,
+                        'status': response.status_code,
+                        'attempt': attempt + 1,
+                        'seconds': round(time.perf_counter() - started, 3),
+                        'response': response.text[:200] if response.status_code != 200 else None
+                    }
+                )
+
+                retryable = response.status_code == 429 or response.status_code >= 500
+                if not retryable or attempt == self.retries:
+                    break
+                reason = 'throttled' if response.status_code == 429 else 'server_error'
+                self._retry(reason, attempt, image_name, response.headers.get('Retry-After'))
+
+            if response.status_code != 200:
+                return False, f'Failed to upload (Status {response.status_code}): {response.text}'
+            metrics.UPLOAD_BYTES.inc(len(image_bytes))
+            try:
+                result = response.json()
+            except ValueError:
+                # A 200 without a JSON body still means the image was accepted
+                return True, 'Image uploaded successfully'
+            if 'error' in result:
+                return False, f"Upload error: {result['error']}"
+            if 'id' in result and not result.get('success'):
+                return True, f"Image uploaded successfully (ID: {result['id']})"
+            return True, 'Image uploaded successfully'
+
+        except Exception as e:
+            logger.exception('Roboflow upload error', extra={'image_name': image_name})
+            return False, f'Error uploading to Roboflow: {str(e)}'
+
+    def _retry(self, reason, attempt, image_name, retry_after=None):
+        """Sleep before the next attempt: jittered exponential backoff, added to Retry-After if given"""
+        ceiling = min(self.backoff_max, self.backoff * 2 ** attempt)
+        try:
+            # Jitter on top of Retry-After keeps throttled workers from retrying in lockstep
+            delay = min(float(retry_after) + random.uniform(0, ceiling), self.backoff_max)
+        except (TypeError, ValueError):
+            delay = random.uniform(ceiling / 2, ceiling)
+        metrics.UPLOAD_RETRIES.labels(reason).inc()
+        frame_logger.info('Retrying Roboflow upload', extra={
+            'image_name': image_name, 'reason': reason, 'attempt': attempt + 1, 'delay': round(delay, 3)
+        })
+        time.sleep(delay)
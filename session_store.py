@@ -0,0 +1,119 @@
+import json
+import sqlite3
+import threading
+import time
+
+# Server-side registry of videos per browser session. The Flask cookie only
+# carries the session id, so request overhead stays constant as queues grow.
+
+_local = threading.local()
+_db_path = 'sessions.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    info TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_videos_session ON videos (session_id, position);
+"""
+
+def init_store(db_path):
+    """Set the database location and create the schema if needed"""
+    global _db_path
+    _db_path = db_path
+    conn = _connection()
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+def _connection():
+    # sqlite3 connections cannot be shared across threads, so keep one per thread
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != _db_path:
+        conn = sqlite3.connect(_db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.conn = conn
+        _local.path = _db_path
+    return conn
+
+def add_video(session_id, video_id, info):
+    """Register a video at the end of a session's queue"""
+    conn = _connection()
+    with conn:
+        row = conn.execute(
+            'SELECT COALESCE(MAX(position), -1) + 1 FROM videos WHERE session_id = ?',
+            (session_id,)
+        ).fetchone()
+        conn.execute(
+            'INSERT INTO videos (video_id, session_id, position, info, created_at) VALUES (?, ?, ?, ?, ?)',
+            (video_id, session_id, row[0], json.dumps(info), time.time())
+        )
+
+def add_videos(session_id, entries):
+    """Register several (video_id, info) pairs in one transaction, keeping their order"""
+    conn = _connection()
+    now = time.time()
+    with conn:
+        row = conn.execute(
+            'SELECT COALESCE(MAX(position), -1) + 1 FROM videos WHERE session_id = ?',
+            (session_id,)
+        ).fetchone()
+        conn.executemany(
+            'INSERT INTO videos (video_id, session_id, position, info, created_at) VALUES (?, ?, ?, ?, ?)',
+            [
+                (video_id, session_id, row[0] + i, json.dumps(info), now)
+                for i, (video_id, info) in enumerate(entries)
+            ]
+        )
+
+def get_video(session_id, video_id):
+    """Return a video's info if it belongs to the session, else None"""
+    row = _connection().execute(
+        'SELECT info FROM videos WHERE video_id = ? AND session_id = ?',
+        (video_id, session_id)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def get_videos(session_id):
+    """Return the session's videos as an ordered {video_id: info} dict"""
+    rows = _connection().execute(
+        'SELECT video_id, info FROM videos WHERE session_id = ? ORDER BY position',
+        (session_id,)
+    ).fetchall()
+    return {video_id: json.loads(info) for video_id, info in rows}
+
+def count_videos():
+    """Total videos registered across all sessions"""
+    return _connection().execute('SELECT COUNT(*) FROM videos').fetchone()[0]
+
+def update_video(video_id, **fields):
+    """Merge fields into a video's info; safe to call from background jobs"""
+    conn = _connection()
+    with conn:
+        row = conn.execute('SELECT info FROM videos WHERE video_id = ?', (video_id,)).fetchone()
+        if not row:
+            return False
+        info = json.loads(row[0])
+        info.update(fields)
+        conn.execute('UPDATE videos SET info = ? WHERE video_id = ?', (json.dumps(info), video_id))
+    return True
+
+def remove_video(session_id, video_id):
+    """Remove a video from a session and return its info"""
+    info = get_video(session_id, video_id)
+    if info is not None:
+        conn = _connection()
+        with conn:
+            conn.execute('DELETE FROM videos WHERE video_id = ? AND session_id = ?', (video_id, session_id))
+    return info
+
+def clear_session(session_id):
+    """Remove all of a session's videos and return them"""
+    videos = get_videos(session_id)
+    conn = _connection()
+    with conn:
+        conn.execute('DELETE FROM videos WHERE session_id = ?', (session_id,))
+    return videos
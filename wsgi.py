@@ -0,0 +1,55 @@
+"""Production entry point.
+
+On Linux/macOS run under gunicorn, which reads gunicorn.conf.py:
+
+    gunicorn -c gunicorn.conf.py
+
+On any platform (including Windows) run the bundled waitress server:
+
+    python wsgi.py
+
+Both are configured through environment variables: BIND (host:port),
+WEB_WORKERS (gunicorn processes), WEB_THREADS (threads per process) and
+WEB_TIMEOUT (seconds a request may run).
+"""
+import logging
+import os
+import signal
+
+from app import app, shutdown_background_jobs
+
+logger = logging.getLogger('videoapp.server')
+
+application = app
+
+
+def serve():
+    """Serve with waitress, stopping background jobs on SIGINT/SIGTERM"""
+    from waitress import serve as waitress_serve
+
+    host, _, port = os.environ.get('BIND', '0.0.0.0:8000').rpartition(':')
+    threads = int(os.environ.get('WEB_THREADS', 8))
+    timeout = int(os.environ.get('WEB_TIMEOUT', 600))
+
+    def handle_sigterm(signum, frame):
+        # waitress stops accepting and drains its task threads on KeyboardInterrupt
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    logger.info('Serving with waitress', extra={'host': host, 'port': int(port), 'threads': threads})
+    try:
+        waitress_serve(
+            application,
+            host=host,
+            port=int(port),
+            threads=threads,
+            channel_timeout=timeout,
+            max_request_body_size=app.config['MAX_CONTENT_LENGTH']
+        )
+    finally:
+        shutdown_background_jobs()
+
+
+if __name__ == '__main__':
+    serve()